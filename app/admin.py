@@ -0,0 +1,24 @@
+import os
+import secrets
+
+from fastapi import HTTPException, Security, status
+from fastapi.security import APIKeyHeader
+
+# Shared secret for operator-only endpoints; admin access is disabled when unset
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+def is_admin_key(key) -> bool:
+    if not ADMIN_API_KEY or not key:
+        return False
+    if isinstance(key, bytes):
+        key = key.decode("latin-1")
+    return secrets.compare_digest(key, ADMIN_API_KEY)
+
+def require_admin(admin_key: str = Security(admin_key_header)):
+    """
+    Dependency that rejects requests without a valid X-Admin-Key header.
+    """
+    if not is_admin_key(admin_key):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required.")
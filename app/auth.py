@@ -1,9 +1,13 @@
 from passlib.context import CryptContext
 
+from app.tracing import traced
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+@traced("auth.hash_password")
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
+@traced("auth.verify_password")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -12,5 +12,7 @@ def add_cors_middleware(app):
         allow_origins=origins,
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"], 
-        allow_headers=["Authorization", "Content-Type"],
+        allow_headers=["Authorization", "Content-Type", "Idempotency-Key"],
+        # Readable by the frontend: when to retry a shed request, and whether a response was replayed
+        expose_headers=["Retry-After", "Idempotent-Replayed"],
     )
@@ -1,13 +1,101 @@
+import heapq
+from itertools import islice
+
+from sqlalchemy import String, cast, func, select, tuple_, type_coerce
+from sqlalchemy.ext.horizontal_shard import set_shard_id
 from sqlalchemy.orm import Session
-from . import models, schemas, auth
+from . import models, schemas, auth, sharding
+from .tracing import traced
+
+@traced("crud.get_user")
+def get_user(db: Session, user_id: int):
+    # Session.get checks the session's identity map first. The identity map only holds weak
+    # references, so loaded users are also pinned in db.info for the life of the request-scoped
+    # session, making repeated loads of the same user within a request free.
+    user = db.get(models.User, user_id)
+    if user is not None:
+        db.info.setdefault("users", {})[user_id] = user
+    return user
 
+@traced("crud.get_user_by_email")
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+@traced("crud.create_user")
 def create_user(db: Session, user: schemas.UserCreate):
     hashed_pw = auth.hash_password(user.password)
-    db_user = models.User(email=user.email, hashed_password=hashed_pw)
+    return insert_user(db, user.email, hashed_pw)
+
+def next_user_id(floor, ceiling):
+    """
+    Subquery for the next unused id in (floor, ceiling), evaluated inside the INSERT so SQLite's
+    writer lock keeps it unique.
+    """
+    return (
+        select(func.coalesce(func.max(models.User.id), floor) + 1)
+        .where(models.User.id > floor, models.User.id < ceiling)
+        .scalar_subquery()
+    )
+
+def insert_user(db: Session, email: str, hashed_password: str):
+    db_user = models.User(email=email, hashed_password=hashed_password)
+    shards = sharding.user_shards(db)
+    if shards is not None:
+        # Take the next id in the range of the email's shard, so the id routes back to it
+        db_user.id = next_user_id(*sharding.user_id_range(sharding.shard_for_email(email, len(shards))))
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
+
+def list_users(db: Session, limit: int, after: tuple = None, is_verified: bool = None, email_prefix: str = None):
+    """
+    Newest-first page of users, keyset-paginated on (created_at, id). Under an email prefix
+    the page is in email order instead, keyset-paginated on (email, id), so the email index
+    serves both the range and the order rather than every match being sorted per page.
+
+    `after` is the page_key of the last row of the previous page. Its created_at is exactly as
+    the database returned it in the `created_at_key` column: comparing against the stored text
+    avoids SQLite mismatches between its own timestamps and re-bound datetimes.
+    """
+    query = db.query(
+        models.User.id,
+        models.User.email,
+        models.User.is_verified,
+        models.User.created_at,
+        cast(models.User.created_at, String).label("created_at_key"),
+    )
+    if is_verified is not None:
+        query = query.filter(models.User.is_verified == is_verified)
+    if email_prefix:
+        # A range instead of LIKE so the unique email index can be used
+        query = query.filter(models.User.email >= email_prefix, models.User.email < email_prefix + "\uffff")
+        if after is not None:
+            query = query.filter(tuple_(models.User.email, models.User.id) > tuple_(*after))
+        return query.order_by(models.User.email, models.User.id).limit(limit)
+    if after is not None:
+        query = query.filter(tuple_(type_coerce(models.User.created_at, String), models.User.id) < tuple_(*after))
+    return query.order_by(models.User.created_at.desc(), models.User.id.desc()).limit(limit)
+
+def page_key(row, email_prefix: str = None) -> tuple:
+    """
+    Keyset position of a list_users row, to pass back as `after` with the same filters.
+    """
+    return (row.email, row.id) if email_prefix else (row.created_at_key, row.id)
+
+def iter_users(db: Session, limit: int, after: tuple = None, is_verified: bool = None, email_prefix: str = None, yield_per: int = 200):
+    """
+    Rows of list_users, streamed. On a sharded session each shard's page is read in order and
+    the pages are merged, so the combined order and cursors are the same as with one database.
+    """
+    shards = sharding.user_shards(db)
+    if shards is None:
+        return iter(list_users(db, limit, after, is_verified, email_prefix).execution_options(yield_per=yield_per))
+    pages = [
+        list_users(db, limit, after, is_verified, email_prefix)
+        .options(set_shard_id(shard))
+        .execution_options(yield_per=yield_per)
+        for shard in shards
+    ]
+    merged = heapq.merge(*pages, key=lambda row: page_key(row, email_prefix), reverse=not email_prefix)
+    return islice(merged, limit)
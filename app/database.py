@@ -8,33 +8,48 @@ if os.getenv("RAILWAY_ENVIRONMENT") is None:
         pass
 
 from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.orm import declarative_base
 
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./local.db")
+from app import sharding
+from app.tracing import instrument_sqlalchemy, span
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./local.db")
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable not set. Please check your .env file.")
 
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(
-        DATABASE_URL
+# Optional comma-separated database URLs to hash-shard the users table across (see app.sharding)
+USER_SHARD_URLS = [url.strip() for url in os.getenv("USER_SHARD_URLS", "").split(",") if url.strip()]
+
+def create_engine_for_url(url: str):
+    if url.startswith("sqlite"):
+        return create_engine(
+            url, connect_args={"check_same_thread": False}
+        )
+    return create_engine(
+        url
     )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine_for_url(DATABASE_URL)
+
+user_engines = [
+    engine if url == DATABASE_URL else create_engine_for_url(url)
+    for url in USER_SHARD_URLS
+] or [engine]
+
+# Sessions are lazy: a pool connection is only checked out on the first query, and released
+# again on commit. Objects stay loaded after commit so reading them doesn't trigger a reload.
+SessionLocal = sharding.make_sessionmaker(
+    engine, user_engines, autocommit=False, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
+instrument_sqlalchemy()
+
 def get_db():
-    db = SessionLocal()
+    with span("dependency.get_db"):
+        db = SessionLocal()
     try:
         yield db
     finally:
@@ -1,3 +1,4 @@
+import logging
 import os
 
 if os.getenv("RAILWAY_ENVIRONMENT") is None:
@@ -10,10 +11,15 @@ if os.getenv("RAILWAY_ENVIRONMENT") is None:
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
 
+from app.tracing import traced
+
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 FROM_EMAIL = os.getenv("FROM_EMAIL")  # e.g., your verified SendGrid sender email
 FRONTEND_DOMAIN = os.getenv("FRONTEND_DOMAIN")
 
+logger = logging.getLogger(__name__)
+
+@traced("email.send_reset_email")
 def send_reset_email(to_email: str, reset_link: str):
     message = Mail(
         from_email=FROM_EMAIL,
@@ -28,10 +34,11 @@ def send_reset_email(to_email: str, reset_link: str):
     try:
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
-        print(f"Password reset email sent to {to_email}. Status Code: {response.status_code}")
-    except Exception as e:
-        print(f"Error sending email: {e}")
+        logger.info("Password reset email sent", extra={"email": to_email, "status_code": response.status_code})
+    except Exception:
+        logger.exception("Error sending password reset email", extra={"email": to_email})
 
+@traced("email.send_verification_email")
 def send_verification_email(to_email: str, token: str):
     verification_link = f"{FRONTEND_DOMAIN}/verify-email?token={token}"
 
@@ -49,6 +56,6 @@ def send_verification_email(to_email: str, token: str):
     try:
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
-        print(f"Verification email sent to {to_email}. Status Code: {response.status_code}")
-    except Exception as e:
-        print(f"Error sending verification email: {e}")
\ No newline at end of file
+        logger.info("Verification email sent", extra={"email": to_email, "status_code": response.status_code})
+    except Exception:
+        logger.exception("Error sending verification email", extra={"email": to_email})
\ No newline at end of file
@@ -0,0 +1,270 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Routes where a retried request would hash a password or send an email again
+IDEMPOTENT_ROUTES = {"/register", "/request-password-reset", "/reset-password"}
+
+IDEMPOTENCY_STORE = os.getenv("IDEMPOTENCY_STORE", "memory")  # "memory" or "sqlite"
+IDEMPOTENCY_SQLITE_PATH = os.getenv("IDEMPOTENCY_SQLITE_PATH", "./idempotency.db")
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", 10_000))
+
+# How long an in-flight claim is honoured before another request may take over (e.g. the
+# worker handling it died), and how long a duplicate waits for the original to finish.
+IN_FLIGHT_TIMEOUT_SECONDS = 60
+WAIT_TIMEOUT_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.05
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+
+class MemoryStore:
+    """
+    Per-process store: a bounded LRU of key -> record, with expiry.
+
+    Records are dicts with the request `fingerprint` and, once the original request has
+    finished, its response `status`, `headers` and `body` (status is None while in flight).
+    """
+    blocking = False
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._records = OrderedDict()  # key -> (expires_at, record)
+        self._lock = threading.Lock()
+
+    def claim(self, key: str, fingerprint: str):
+        """
+        Marks the key in flight if nobody holds it. Returns None when the caller now owns the
+        key, otherwise the existing record.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._records.get(key)
+            if entry is not None and entry[0] > now:
+                self._records.move_to_end(key)
+                return entry[1]
+
+            self._records[key] = (now + IN_FLIGHT_TIMEOUT_SECONDS, {"fingerprint": fingerprint, "status": None})
+            self._records.move_to_end(key)
+            while len(self._records) > self.max_keys:
+                self._records.popitem(last=False)
+        return None
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._records.get(key)
+        if entry is None or entry[0] <= time.time():
+            return None
+        return entry[1]
+
+    def complete(self, key: str, fingerprint: str, status: int, headers: list, body: bytes):
+        record = {"fingerprint": fingerprint, "status": status, "headers": headers, "body": body}
+        with self._lock:
+            self._records[key] = (time.time() + self.ttl, record)
+
+    def release(self, key: str):
+        with self._lock:
+            self._records.pop(key, None)
+
+class SQLiteStore:
+    """
+    Store shared by every worker on a host, kept in its own SQLite file.
+    """
+    blocking = True
+
+    def __init__(self, path: str = IDEMPOTENCY_SQLITE_PATH, ttl: int = IDEMPOTENCY_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._claims = 0
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    status INTEGER,
+                    headers TEXT,
+                    body BLOB,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key: str, fingerprint: str):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._claims += 1
+            if self._claims % 1000 == 0:
+                conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+            else:
+                conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND expires_at <= ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO idempotency_keys (key, fingerprint, expires_at) VALUES (?, ?, ?)",
+                (key, fingerprint, now + IN_FLIGHT_TIMEOUT_SECONDS),
+            ).rowcount
+            record = None if inserted else self._select(conn, key)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return record
+
+    def get(self, key: str):
+        return self._select(self._connection(), key)
+
+    def _select(self, conn: sqlite3.Connection, key: str):
+        row = conn.execute(
+            "SELECT fingerprint, status, headers, body FROM idempotency_keys WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        fingerprint, status, headers, body = row
+        return {
+            "fingerprint": fingerprint,
+            "status": status,
+            "headers": json.loads(headers) if headers else None,
+            "body": body,
+        }
+
+    def complete(self, key: str, fingerprint: str, status: int, headers: list, body: bytes):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, status, headers, body, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, fingerprint, status, json.dumps(headers), body, time.time() + self.ttl),
+        )
+
+    def release(self, key: str):
+        self._connection().execute("DELETE FROM idempotency_keys WHERE key = ? AND status IS NULL", (key,))
+
+def make_store():
+    if IDEMPOTENCY_STORE == "sqlite":
+        return SQLiteStore()
+    return MemoryStore()
+
+store = make_store()
+
+class IdempotencyMiddleware:
+    """
+    Honours an `Idempotency-Key` header on POSTs to IDEMPOTENT_ROUTES.
+
+    The first request with a key runs normally and its response is stored (unless it is a
+    5xx, so those can be retried). Repeats replay the stored response with an
+    `Idempotent-Replayed: true` header, and duplicates arriving while the first is still
+    running wait for it rather than executing again. Reusing a key with a different body
+    is rejected with 422.
+    """
+    def __init__(self, app, store=store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in IDEMPOTENT_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        idempotency_key = dict(scope.get("headers") or []).get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            await self.app(scope, receive, send)
+            return
+
+        key = f"{scope['path']}:{idempotency_key.decode('latin-1')}"
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        record = await self._call(self.store.claim, key, fingerprint)
+        deadline = time.monotonic() + WAIT_TIMEOUT_SECONDS
+        while record is not None and record["status"] is None and record["fingerprint"] == fingerprint:
+            if time.monotonic() >= deadline:
+                await _send_json(send, 409, "A request with this Idempotency-Key is still in progress.")
+                return
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            record = await self._call(self.store.get, key)
+            if record is None:
+                # The original failed and released the key; try to take it over
+                record = await self._call(self.store.claim, key, fingerprint)
+
+        if record is not None:
+            if record["fingerprint"] != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used with a different request body.")
+                return
+            await _replay(send, record)
+            return
+
+        await self._execute(scope, body, receive, send, key, fingerprint)
+
+    async def _execute(self, scope, body: bytes, receive, send, key: str, fingerprint: str):
+        response = {"status": None, "headers": [], "body": []}
+        body_delivered = False
+
+        async def receive_body():
+            # Hand the buffered body to the app once, then fall back to the real channel
+            nonlocal body_delivered
+            if body_delivered:
+                return await receive()
+            body_delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                if not message.get("more_body", False) and response["status"] < 500:
+                    await self._call(
+                        self.store.complete, key, fingerprint,
+                        response["status"], response["headers"], b"".join(response["body"]),
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, capture)
+        finally:
+            if response["status"] is None or response["status"] >= 500:
+                await self._call(self.store.release, key)
+
+    async def _call(self, method, *args):
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+async def _replay(send, record: dict):
+    headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+    headers.append((b"idempotent-replayed", b"true"))
+    await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+    await send({"type": "http.response.body", "body": record["body"]})
+
+async def _send_json(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
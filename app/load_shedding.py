@@ -0,0 +1,180 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# POST routes whose cost is dominated by bcrypt; everything else bypasses admission control
+HASHING_ROUTES = {"/login", "/register", "/reset-password"}
+
+LOAD_SHEDDING_MAX_CONCURRENCY = int(os.getenv("LOAD_SHEDDING_MAX_CONCURRENCY", os.cpu_count() or 4))
+LOAD_SHEDDING_MAX_QUEUE = int(os.getenv("LOAD_SHEDDING_MAX_QUEUE", 64))
+LOAD_SHEDDING_TARGET_MS = int(os.getenv("LOAD_SHEDDING_TARGET_MS", 100))
+LOAD_SHEDDING_INTERVAL_MS = int(os.getenv("LOAD_SHEDDING_INTERVAL_MS", 1000))
+LOAD_SHEDDING_MAX_WAIT_MS = int(os.getenv("LOAD_SHEDDING_MAX_WAIT_MS", 2000))
+
+class AdmissionController:
+    """
+    Limits concurrent hashing requests and sheds load CoDel-style.
+
+    Requests beyond max_concurrency wait in a FIFO queue. The time each one spends queued
+    (its sojourn time) is compared with `target`: once sojourn times have stayed above target
+    for a whole `interval`, the controller enters the dropping state and rejects new arrivals
+    that would have to queue, until a request is admitted below target again. A full queue or
+    a wait longer than max_wait also sheds.
+
+    State is guarded by a threading lock and waiters are woken through their own event loop,
+    so one controller can be shared by every loop in the process.
+    """
+    def __init__(
+        self,
+        max_concurrency: int = LOAD_SHEDDING_MAX_CONCURRENCY,
+        max_queue: int = LOAD_SHEDDING_MAX_QUEUE,
+        target: float = LOAD_SHEDDING_TARGET_MS / 1000,
+        interval: float = LOAD_SHEDDING_INTERVAL_MS / 1000,
+        max_wait: float = LOAD_SHEDDING_MAX_WAIT_MS / 1000,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.target = target
+        self.interval = interval
+        self.max_wait = max_wait
+
+        self.in_flight = 0
+        self.dropping = False
+        self.admitted = 0
+        self.shed = 0
+        self.last_sojourn = 0.0
+        self.service_time = 0.25  # EWMA of request duration, seeded with a typical bcrypt verify
+
+        self._first_above_time = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> bool:
+        """
+        Waits for a hashing slot. Returns False if the request should be shed.
+        """
+        with self._lock:
+            if self.in_flight < self.max_concurrency and not self._waiters:
+                self.in_flight += 1
+                self._admit(0.0, time.monotonic())
+                return True
+            if self.dropping or len(self._waiters) >= self.max_queue:
+                self.shed += 1
+                return False
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future(), time.monotonic())
+            self._waiters.append(waiter)
+
+        try:
+            await asyncio.wait_for(waiter[1], self.max_wait)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self.shed += 1
+                    return False
+            # release() handed us the slot just as we timed out
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release()
+            raise
+        return True
+
+    def release(self, duration: float = None):
+        with self._lock:
+            if duration is not None:
+                self.service_time = 0.8 * self.service_time + 0.2 * duration
+            if self._waiters:
+                # Hand the slot straight to the oldest waiter; in_flight is unchanged
+                loop, future, enqueued_at = self._waiters.popleft()
+                now = time.monotonic()
+                self._admit(now - enqueued_at, now)
+                loop.call_soon_threadsafe(_wake, future)
+            else:
+                self.in_flight -= 1
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the current queue should have drained, as a Retry-After hint.
+        """
+        with self._lock:
+            backlog = len(self._waiters) + self.in_flight
+        return max(1, math.ceil(backlog * self.service_time / max(1, self.max_concurrency)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "dropping": self.dropping,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "last_sojourn_ms": round(self.last_sojourn * 1000, 3),
+                "service_time_ms": round(self.service_time * 1000, 3),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "target_ms": self.target * 1000,
+                "interval_ms": self.interval * 1000,
+            }
+
+    def _admit(self, sojourn: float, now: float):
+        # Called with the lock held
+        self.admitted += 1
+        self.last_sojourn = sojourn
+        if sojourn < self.target:
+            self._first_above_time = 0.0
+            self.dropping = False
+        elif self._first_above_time == 0.0:
+            self._first_above_time = now + self.interval
+        elif now >= self._first_above_time:
+            self.dropping = True
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+controller = AdmissionController()
+
+class LoadSheddingMiddleware:
+    """
+    Runs POSTs to HASHING_ROUTES through the admission controller, answering shed
+    requests with 503 and a Retry-After header. Other routes pass straight through.
+    """
+    def __init__(self, app, controller: AdmissionController = controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in HASHING_ROUTES:
+            await self.app(scope, receive, send)
+            return
+
+        if not await self.controller.acquire():
+            await self._reject(send)
+            return
+
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.monotonic() - started)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": "Server is busy. Please retry shortly."}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after()).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
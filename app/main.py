@@ -1,9 +1,12 @@
 from dotenv import load_dotenv
+import asyncio
+import json
+import logging
 import os
 from datetime import datetime, timedelta, timezone
 
-from fastapi import APIRouter, FastAPI, Depends, HTTPException, status, Body, Request, Security, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, status, Body, Query, Request, Response, Security, BackgroundTasks
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import APIKeyHeader
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
@@ -12,56 +15,96 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
-from app import models, schemas, crud, database, auth
+from app import models, schemas, crud, database, auth, tracing, purge, sharding
+from app.admin import require_admin
 from app.auth import verify_password, hash_password
-from app.utils.event_logger import mask_email, record_event
+from app.utils.etag import etag_matches, user_etag
+from app.utils.structured_logging import setup_logging, shutdown_logging
+from app.utils.event_logger import flush_rollups, mask_email, record_event, run_rollup_flusher
+from app.utils.pagination import decode_cursor, encode_cursor
 from app.cors import add_cors_middleware
 from app.cooldown_manager import resend_verification_cache, reset_password_cache, check_and_update_cooldown
-from app.database import SessionLocal
+from app.database import SessionLocal, get_db
 from app.email_sender import send_verification_email, send_reset_email
+from app.idempotency import IdempotencyMiddleware
 from app.jwt_handler import create_access_token, create_refresh_token, verify_token
-from app.models import User
+from app.load_shedding import LoadSheddingMiddleware, controller as admission_controller
+from app.password_blocklist import get_blocklist, is_breached
+from app.profiler import ProfilerMiddleware, profiler
 from app.reset_token_handler import create_password_reset_token, verify_password_reset_token
 from app.schemas import PasswordResetRequest, ResetPassword, UserLogin, EmailRequest
+from app.tracing import TracedRoute, TracingMiddleware
 from app.verification_token_handler import create_email_verification_token, verify_email_verification_token
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Started and stopped here, in pairs, so an app that goes through several lifespans in
+    # one process gets a running log writer each time
+    setup_logging()
     models.Base.metadata.create_all(bind=database.engine)
+    # create_all skips indexes on tables that already exist; user shards get the users table too
+    sharding.create_user_tables([database.engine, *database.user_engines])
+    # Open the blocklist now so a bad PASSWORD_BLOCKLIST_PATH stops startup instead of
+    # failing every /register and /reset-password
+    get_blocklist()
+
+    purge_task = None
+    if purge.UNVERIFIED_PURGE_INTERVAL_MINUTES > 0:
+        purge_task = asyncio.create_task(purge.run_sweeper())
+
+    rollup_task = asyncio.create_task(run_rollup_flusher())
+
     yield
 
+    if purge_task is not None:
+        purge_task.cancel()
+    rollup_task.cancel()
+    # Don't lose counts for the minute in progress on shutdown
+    flush_rollups(include_current=True)
+    shutdown_logging()
+
+tracing.configure_from_env()
+
 app = FastAPI(lifespan=lifespan)
+app.router.route_class = TracedRoute
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_middleware(SlowAPIMiddleware)
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(LoadSheddingMiddleware)
+# Outside load shedding so replayed responses don't take a hashing slot
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(TracingMiddleware)
+# Outermost, so preflights are answered before anything else runs and responses produced by
+# the middlewares above (503 shed, 409/422 idempotency) still carry CORS headers
 add_cors_middleware(app)
 
 api_key_header = APIKeyHeader(name="Authorization")
-router = APIRouter()
+router = APIRouter(route_class=TracedRoute)
 
 load_dotenv()
 
 FRONTEND_DOMAIN = os.getenv("FRONTEND_DOMAIN")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+logger = logging.getLogger(__name__)
+
+BREACHED_PASSWORD_DETAIL = "This password has appeared in a data breach. Please choose a different password."
 
 @limiter.limit("15/hour")
 @app.post("/register", response_model=schemas.UserResponse)
 def register(request: Request, user: schemas.UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     if crud.get_user_by_email(db, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    
+
+    if is_breached(user.password):
+        raise HTTPException(status_code=400, detail=BREACHED_PASSWORD_DETAIL)
+
     new_user = crud.create_user(db, user)
 
     token = create_email_verification_token(new_user.email)
     send_verification_email(new_user.email, token)
-    print(f"Verification token for {new_user.email}: {token}")
+    logger.debug("Verification token issued", extra={"email": new_user.email, "token": token})
 
     background_tasks.add_task(
         record_event,
@@ -79,7 +122,7 @@ def verify_email(request: Request, token: str, background_tasks: BackgroundTasks
     if email is None:
         raise HTTPException(status_code=400, detail="Invalid or expired token.")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = crud.get_user_by_email(db, email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
     if user.is_verified:
@@ -110,7 +153,7 @@ def resend_verification_email(request: Request, email_request: EmailRequest, db:
         error_message="Please wait before requesting another verification email."
     )
 
-    user = db.query(User).filter(User.email == email_request.email).first()
+    user = crud.get_user_by_email(db, email_request.email)
 
     if not user:
         return {"message": "If an account with that email exists, a verification email has been resent."}
@@ -126,7 +169,7 @@ def resend_verification_email(request: Request, email_request: EmailRequest, db:
 @limiter.limit("5/minute")
 @app.post("/login")
 def login(request: Request, user_credentials: UserLogin, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    user = db.query(User).filter(models.User.email == user_credentials.email).first()
+    user = crud.get_user_by_email(db, user_credentials.email)
 
     if not user or not verify_password(user_credentials.password, user.hashed_password):
         record_event(
@@ -174,7 +217,8 @@ def refresh_token(request: Request, refresh_token: str = Body(...), db: Session
 
     user_id = payload.get("user_id")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # Already in the session's identity map from verify_token
+    user = crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
 
@@ -208,7 +252,7 @@ def request_password_reset(
         error_message="Please wait before requesting another password reset email."
     )
 
-    user = db.query(User).filter(User.email == email).first()
+    user = crud.get_user_by_email(db, email)
 
     if not user:
         record_event(
@@ -221,7 +265,7 @@ def request_password_reset(
     reset_token = create_password_reset_token(user.email)
     reset_link = f"{FRONTEND_DOMAIN}/reset-password?token={reset_token}"
     send_reset_email(user.email, reset_link)
-    print(reset_token)
+    logger.debug("Password reset token issued", extra={"email": user.email, "token": reset_token})
 
     background_tasks.add_task(
         record_event,
@@ -244,10 +288,13 @@ def reset_password(
     if email is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired password reset token.")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = crud.get_user_by_email(db, email)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found.")
 
+    if is_breached(payload.new_password):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=BREACHED_PASSWORD_DETAIL)
+
     user.hashed_password = hash_password(payload.new_password)
     user.last_password_reset = datetime.now(timezone.utc)
     db.commit()
@@ -283,4 +330,87 @@ def protected_route(request: Request, background_tasks: BackgroundTasks, token:
 
     return {"message": f"Welcome user {user_id}!"}
 
+@limiter.limit("60/minute")
+@app.get("/me", response_model=schemas.UserProfile)
+def read_current_user(request: Request, response: Response, token: str = Security(api_key_header), db: Session = Depends(get_db)):
+    if not token.startswith("Bearer "):
+        raise HTTPException(status_code=403, detail="Invalid authorization header format")
+
+    real_token = token.split("Bearer ")[1]
+    payload = verify_token(real_token, db)
+    if payload is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    # Already in the session's identity map from verify_token
+    user = crud.get_user(db, payload.get("user_id"))
+
+    etag = user_etag(user)
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Authorization",
+    }
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers)
+
+    response.headers.update(cache_headers)
+    return user
+
+@app.get("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def get_profile(route: str = None):
+    return profiler.collapsed(route)
+
+@app.delete("/admin/profile", dependencies=[Depends(require_admin)])
+def reset_profile():
+    profiler.reset()
+    return {"message": "Profile samples cleared."}
+
+@app.get("/admin/users", dependencies=[Depends(require_admin)])
+def list_users(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: str = None,
+    verified: bool = None,
+    email_prefix: str = None,
+):
+    # Cursors name the ordering they continue: by email under a prefix filter, else by creation
+    cursor_kind = "email" if email_prefix else "created"
+    after = None
+    if cursor:
+        try:
+            kind, *after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+        if kind != cursor_kind or len(after) != 2:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+        after = tuple(after)
+
+    def stream_page():
+        # The request-scoped session is closed before a streamed body is sent, so the
+        # page is read with its own session while it is being written out.
+        db = SessionLocal()
+        try:
+            rows = crud.iter_users(db, limit + 1, after, verified, email_prefix)
+            yield '{"users":['
+            last = None
+            has_more = False
+            for i, row in enumerate(rows):
+                if i == limit:
+                    has_more = True
+                    break
+                user = schemas.AdminUserResponse.model_validate(row)
+                yield ("," if i else "") + user.model_dump_json()
+                last = row
+
+            next_cursor = encode_cursor(cursor_kind, *crud.page_key(last, email_prefix)) if has_more else None
+            yield '],"next_cursor":' + json.dumps(next_cursor) + "}"
+        finally:
+            db.close()
+
+    return StreamingResponse(stream_page(), media_type="application/json")
+
+@app.get("/admin/load-shedding", dependencies=[Depends(require_admin)])
+def get_load_shedding_state():
+    return admission_controller.stats()
+
 app.include_router(router)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime, func, Text, JSON
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, func, Text, JSON, Index
 from datetime import datetime, timezone
 from .database import Base
 
@@ -18,6 +18,20 @@ class User(Base):
         default=lambda: datetime.now(timezone.utc)
     )
 
+    __table_args__ = (
+        # Only unverified rows are indexed, so the purge sweep stays cheap as the table grows
+        Index(
+            "ix_users_unverified_created_at",
+            "is_verified",
+            "created_at",
+            sqlite_where=is_verified == False,
+            postgresql_where=is_verified == False,
+        ),
+        # Keyset pagination for the admin listing; includes every listed column so pages are
+        # served from the index alone
+        Index("ix_users_created_at_id", "created_at", "id", "is_verified", "email"),
+    )
+
 class Event(Base):
     __tablename__ = "events"
 
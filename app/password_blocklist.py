@@ -0,0 +1,180 @@
+"""
+Breached-password blocklist backed by a memory-mapped file of sorted SHA-1 prefixes.
+
+Build it once from a Have I Been Pwned style dump ("SHA1HEX:count" per line) or a plain
+password list:
+
+    python -m app.password_blocklist build pwned-passwords-sha1.txt blocklist.bin
+    python -m app.password_blocklist build --plaintext rockyou.txt blocklist.bin
+
+File layout: an 8-byte magic and 8-byte record count, a 65536-entry fan-out table of
+record offsets indexed by the first two prefix bytes, then the sorted, de-duplicated 8-byte
+big-endian SHA-1 prefixes. A lookup is a fan-out read plus a binary search of one bucket,
+touching only a handful of pages, so the file is never loaded into RAM.
+"""
+import argparse
+import hashlib
+import heapq
+import logging
+import mmap
+import os
+import struct
+import tempfile
+
+MAGIC = b"PWBL\x00\x00\x00\x01"
+PREFIX_BYTES = 8
+FANOUT_ENTRIES = 1 << 16
+HEADER_SIZE = len(MAGIC) + 8
+FANOUT_SIZE = FANOUT_ENTRIES * 8
+RUN_SIZE = 20_000_000  # prefixes sorted in memory per run while building
+
+PASSWORD_BLOCKLIST_PATH = os.getenv("PASSWORD_BLOCKLIST_PATH")
+
+_PREFIX = struct.Struct(">Q")
+
+logger = logging.getLogger("app.password_blocklist")
+
+def password_prefix(password: str) -> int:
+    return _PREFIX.unpack_from(hashlib.sha1(password.encode("utf-8")).digest())[0]
+
+class PasswordBlocklist:
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a password blocklist file")
+        self.count = struct.unpack_from(">Q", self._mmap, len(MAGIC))[0]
+        self._records_start = HEADER_SIZE + FANOUT_SIZE
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, password: str) -> bool:
+        return self.contains_prefix(password_prefix(password))
+
+    def contains_prefix(self, prefix: int) -> bool:
+        bucket = prefix >> 48
+        lo = struct.unpack_from(">Q", self._mmap, HEADER_SIZE + bucket * 8)[0]
+        hi = (
+            struct.unpack_from(">Q", self._mmap, HEADER_SIZE + (bucket + 1) * 8)[0]
+            if bucket + 1 < FANOUT_ENTRIES else self.count
+        )
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = _PREFIX.unpack_from(self._mmap, self._records_start + mid * PREFIX_BYTES)[0]
+            if value < prefix:
+                lo = mid + 1
+            elif value > prefix:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def close(self):
+        self._mmap.close()
+
+_blocklist = None
+
+def get_blocklist():
+    """
+    Opens the blocklist at PASSWORD_BLOCKLIST_PATH on first use. Returns None when unset.
+    """
+    global _blocklist
+    if _blocklist is None and PASSWORD_BLOCKLIST_PATH:
+        _blocklist = PasswordBlocklist(PASSWORD_BLOCKLIST_PATH)
+    return _blocklist
+
+def is_breached(password: str) -> bool:
+    blocklist = get_blocklist()
+    return blocklist is not None and password in blocklist
+
+# --- Build step ---
+
+def _read_prefixes(path: str, plaintext: bool):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if plaintext:
+                yield password_prefix(line)
+            else:
+                yield int(line.split(":", 1)[0][:PREFIX_BYTES * 2], 16)
+
+def _write_run(prefixes: list, directory: str) -> str:
+    prefixes.sort()
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(fd, "wb", buffering=1 << 20) as f:
+        for prefix in prefixes:
+            f.write(_PREFIX.pack(prefix))
+    return path
+
+def _read_run(path: str):
+    with open(path, "rb", buffering=1 << 20) as f:
+        while chunk := f.read(PREFIX_BYTES * 65536):
+            for (prefix,) in _PREFIX.iter_unpack(chunk):
+                yield prefix
+
+def build(source: str, output: str, plaintext: bool = False, run_size: int = RUN_SIZE) -> int:
+    """
+    Compiles `source` into a blocklist file at `output` with an external merge sort, so inputs
+    far larger than memory can be built. Returns the number of distinct prefixes written.
+    """
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) as work_dir:
+        runs = []
+        chunk = []
+        for prefix in _read_prefixes(source, plaintext):
+            chunk.append(prefix)
+            if len(chunk) >= run_size:
+                runs.append(_write_run(chunk, work_dir))
+                chunk = []
+        if chunk:
+            runs.append(_write_run(chunk, work_dir))
+
+        fanout = [0] * FANOUT_ENTRIES
+        count = 0
+        previous = None
+        with open(output, "wb") as f:
+            f.write(b"\x00" * (HEADER_SIZE + FANOUT_SIZE))
+            for prefix in heapq.merge(*(_read_run(run) for run in runs)):
+                if prefix == previous:
+                    continue
+                fanout[prefix >> 48] += 1
+                f.write(_PREFIX.pack(prefix))
+                previous = prefix
+                count += 1
+
+            # Turn bucket sizes into start offsets
+            offset = 0
+            for bucket, size in enumerate(fanout):
+                fanout[bucket] = offset
+                offset += size
+
+            f.seek(0)
+            f.write(MAGIC + struct.pack(">Q", count))
+            f.write(struct.pack(f">{FANOUT_ENTRIES}Q", *fanout))
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the breached-password blocklist.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Compile a password hash list into a blocklist file")
+    build_parser.add_argument("source", help="Input list: 'SHA1HEX[:count]' per line, or passwords with --plaintext")
+    build_parser.add_argument("output", help="Blocklist file to write")
+    build_parser.add_argument("--plaintext", action="store_true", help="Input lines are plaintext passwords")
+    build_parser.add_argument("--run-size", type=int, default=RUN_SIZE, help="Prefixes sorted in memory per run")
+    args = parser.parse_args()
+
+    from app.utils.structured_logging import setup_logging, shutdown_logging
+
+    setup_logging()
+    try:
+        count = build(args.source, args.output, args.plaintext, args.run_size)
+        logger.info("Wrote password blocklist", extra={"prefixes": count, "path": args.output})
+    finally:
+        shutdown_logging()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from inspect import unwrap
+
+from fastapi.routing import APIRoute
+
+from app.admin import is_admin_key
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILER_HZ = int(os.getenv("PROFILER_HZ", 200))
+PROFILER_ROUTES = os.getenv("PROFILER_ROUTES", ".*")
+
+PROFILE_HEADER = b"x-profile"
+ADMIN_KEY_HEADER = b"x-admin-key"
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of threads running route endpoints and aggregates them
+    into collapsed-stack ("frame;frame;frame count") format for flamegraph tools.
+
+    A daemon thread takes a sample every 1/hz seconds, but only while at least one
+    profiled request is in flight; otherwise it sleeps on an event.
+    """
+    def __init__(self, hz: int = PROFILER_HZ, route_pattern: str = PROFILER_ROUTES):
+        self.interval = 1.0 / hz
+        self.route_pattern = re.compile(route_pattern)
+        self.stacks = Counter()
+        self._endpoint_routes = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._thread = None
+
+    def matches(self, path: str) -> bool:
+        return self.route_pattern.fullmatch(path) is not None
+
+    def begin(self, app):
+        with self._lock:
+            if self._endpoint_routes is None:
+                self._endpoint_routes = self._map_endpoints(app)
+            self._in_flight += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+            self._active.set()
+
+    def end(self):
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._active.clear()
+
+    def collapsed(self, route: str = None) -> str:
+        """
+        Returns the aggregated samples, one "route;frame;...;frame count" line per unique stack.
+        """
+        with self._lock:
+            items = sorted(self.stacks.items())
+        lines = [
+            f"{stack} {count}" for stack, count in items
+            if route is None or stack.split(";", 1)[0] == route
+        ]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def reset(self):
+        with self._lock:
+            self.stacks.clear()
+
+    def _map_endpoints(self, app) -> dict:
+        # Code object of each matching endpoint -> route path, used to recognise the
+        # threads that are currently serving a profiled route.
+        return {
+            unwrap(route.endpoint).__code__: route.path
+            for route in getattr(app, "routes", [])
+            if isinstance(route, APIRoute) and self.matches(route.path)
+        }
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            self._active.wait()
+            self._sample(own_ident)
+            time.sleep(self.interval)
+
+    def _sample(self, own_ident: int):
+        samples = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            stack = []
+            route = None
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                route = self._endpoint_routes.get(code)
+                if route is not None:
+                    break
+                frame = frame.f_back
+
+            if route is not None:
+                stack.append(route)
+                samples.append(";".join(reversed(stack)))
+
+        if samples:
+            with self._lock:
+                self.stacks.update(samples)
+
+profiler = SamplingProfiler()
+
+def _admin_requested(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    return PROFILE_HEADER in headers and is_admin_key(headers.get(ADMIN_KEY_HEADER))
+
+class ProfilerMiddleware:
+    """
+    Profiles matching requests when PROFILER_ENABLED is set, or per request when an
+    admin sends `X-Profile` together with a valid `X-Admin-Key`.
+    """
+    def __init__(self, app, profiler: SamplingProfiler = profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not (PROFILER_ENABLED or _admin_requested(scope))
+            or not self.profiler.matches(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        self.profiler.begin(scope["app"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end()
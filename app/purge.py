@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import User
+from app.utils.event_logger import record_event
+
+UNVERIFIED_USER_MAX_AGE_HOURS = int(os.getenv("UNVERIFIED_USER_MAX_AGE_HOURS", 72))
+UNVERIFIED_PURGE_INTERVAL_MINUTES = int(os.getenv("UNVERIFIED_PURGE_INTERVAL_MINUTES", 60))  # 0 disables the sweeper
+UNVERIFIED_PURGE_BATCH_SIZE = int(os.getenv("UNVERIFIED_PURGE_BATCH_SIZE", 500))
+
+# Pause between batches so writers queued behind the delete get a turn at the lock
+BATCH_PAUSE_SECONDS = 0.05
+
+logger = logging.getLogger(__name__)
+
+def purge_unverified_users(
+    db: Session,
+    max_age: timedelta = timedelta(hours=UNVERIFIED_USER_MAX_AGE_HOURS),
+    batch_size: int = UNVERIFIED_PURGE_BATCH_SIZE,
+    pause: float = BATCH_PAUSE_SECONDS,
+) -> int:
+    """
+    Deletes unverified users created before now - max_age, one short transaction per batch.
+
+    Returns the number of deleted users.
+    """
+    cutoff = datetime.now(timezone.utc) - max_age
+    deleted = 0
+    batches = 0
+
+    while True:
+        # Served by the (is_verified, created_at) partial index on users
+        ids = [
+            row.id for row in db.query(User.id)
+            .filter(User.is_verified == False, User.created_at < cutoff)
+            .order_by(User.created_at)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+
+        # Re-check is_verified so a user verifying mid-sweep is never deleted
+        deleted += db.query(User).filter(User.id.in_(ids), User.is_verified == False).delete(synchronize_session=False)
+        db.commit()
+        batches += 1
+
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    if deleted:
+        record_event(
+            "unverified_users_purged",
+            None,
+            {"count": deleted, "batches": batches, "cutoff": cutoff.isoformat()}
+        )
+    return deleted
+
+def run_purge():
+    db = SessionLocal()
+    try:
+        return purge_unverified_users(db)
+    finally:
+        db.close()
+
+async def run_sweeper(interval: timedelta = timedelta(minutes=UNVERIFIED_PURGE_INTERVAL_MINUTES)):
+    """
+    Background loop started from the app lifespan; purges stale unverified users every interval.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(run_purge)
+        except Exception:
+            logger.exception("Error purging unverified users")
+        await asyncio.sleep(interval.total_seconds())
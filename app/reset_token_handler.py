@@ -9,18 +9,22 @@ if os.getenv("RAILWAY_ENVIRONMENT") is None:
     except ImportError:
         pass
 
+from app.tracing import traced
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
 # Password reset token expiration time (e.g., 15 minutes)
 RESET_TOKEN_EXPIRE_MINUTES = 15
 
+@traced("jwt.create_password_reset_token")
 def create_password_reset_token(email: str):
     expire = datetime.now(timezone.utc) + timedelta(minutes=RESET_TOKEN_EXPIRE_MINUTES)
     to_encode = {"sub": email, "exp": expire}
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@traced("jwt.verify_password_reset_token")
 def verify_password_reset_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -1,3 +1,6 @@
+from datetime import datetime
+from typing import Optional
+
 from pydantic import BaseModel, ConfigDict, EmailStr
 
 class UserCreate(BaseModel):
@@ -14,6 +17,18 @@ class UserResponse(BaseModel):
 
     model_config = ConfigDict(from_attributes=True)
 
+class UserProfile(UserResponse):
+    is_verified: bool
+    verified_at: Optional[datetime] = None
+
+class AdminUserResponse(BaseModel):
+    id: int
+    email: str
+    is_verified: bool
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class PasswordResetRequest(BaseModel):
     email: EmailStr
 
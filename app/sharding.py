@@ -0,0 +1,325 @@
+"""
+Optional hash sharding of the users table across several databases.
+
+Set USER_SHARD_URLS to a comma-separated list of database URLs and each user is stored in
+exactly one of them, picked by a jump consistent hash of their normalized email. Everything
+else (events) stays in DATABASE_URL, which may also appear in the list. A user's shard is
+encoded in the high bits of their id, so a lookup by id (token verification) or by email
+(login, reset) goes straight to one database. Unset, there is a single shard and sessions are
+plain SQLAlchemy sessions, exactly as before.
+
+Changing the shard list moves some users to other shards and gives them new ids. Stop the
+app and rebalance first:
+
+    python -m app.sharding rebalance --from sqlite:///./local.db \\
+        --to sqlite:///./local.db,sqlite:///./users1.db,sqlite:///./users2.db
+
+Ids are allocated per shard as max(id) + 1 inside the INSERT, which is only atomic under
+SQLite's writer lock, so every shard must be a SQLite database. Shards are meant to spread
+SQLite's single writer; server databases that already handle concurrent writers don't need them.
+"""
+import argparse
+import hashlib
+import logging
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, case, func, inspect, select
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+# The low SHARD_ID_BITS of a user id count users within a shard; the bits above are the shard.
+# Ids stay within a signed 32-bit INTEGER, and ids from before sharding all decode to shard 0.
+SHARD_ID_BITS = 26
+MAX_SHARDS = 32
+
+USERS_TABLE = "users"
+
+logger = logging.getLogger("app.sharding")
+
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+def jump_hash(key: int, buckets: int) -> int:
+    """
+    Jump consistent hash (Lamping & Veach): growing from n to n + 1 buckets moves only 1/(n + 1)
+    of the keys, all of them into the new bucket.
+    """
+    bucket, j = -1, 0
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+def shard_for_email(email: str, shard_count: int) -> int:
+    digest = hashlib.blake2b(normalize_email(email).encode("utf-8"), digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), shard_count)
+
+def shard_for_user_id(user_id: int) -> int:
+    return int(user_id) >> SHARD_ID_BITS
+
+def user_id_range(shard: int) -> tuple:
+    """
+    (floor, ceiling) of the ids shard `shard` hands out, both exclusive.
+    """
+    floor = shard << SHARD_ID_BITS
+    return floor, floor + (1 << SHARD_ID_BITS)
+
+def user_shards(db) -> list:
+    """
+    Shard ids of the users table for `db`, or None for an unsharded session.
+    """
+    return db.info.get("user_shards")
+
+def _is_user_mapper(mapper) -> bool:
+    return mapper is not None and mapper.local_table.name == USERS_TABLE
+
+def _shards_from_criteria(whereclause, shard_count: int) -> set:
+    """
+    Shards named by `email == x`, `id == x` or `id IN (...)` criteria; empty if there are none.
+    """
+    shards = set()
+    if whereclause is None:
+        return shards
+    for element in visitors.iterate(whereclause):
+        if not isinstance(element, BinaryExpression) or not isinstance(element.right, BindParameter):
+            continue
+        column = getattr(element.left, "name", None)
+        table = getattr(getattr(element.left, "table", None), "name", None)
+        if table != USERS_TABLE:
+            continue
+        value = element.right.effective_value
+        if column == "email" and element.operator is operators.eq and value is not None:
+            shards.add(shard_for_email(value, shard_count))
+        elif column == "id" and element.operator is operators.eq and value is not None:
+            shards.add(shard_for_user_id(value))
+        elif column == "id" and element.operator is operators.in_op and value:
+            shards.update(shard_for_user_id(user_id) for user_id in value)
+    return shards
+
+def make_sessionmaker(primary_engine, user_engines: list, **kwargs) -> sessionmaker:
+    """
+    Session factory that stores users across `user_engines` and everything else in
+    `primary_engine`. With a single user engine this is a plain sessionmaker.
+    """
+    if len(user_engines) <= 1:
+        return sessionmaker(bind=primary_engine, **kwargs)
+    if len(user_engines) > MAX_SHARDS:
+        raise ValueError(f"At most {MAX_SHARDS} user shards are supported")
+    # max(id) + 1 in crud.insert_user relies on SQLite's single writer to hand out unique ids
+    if any(engine.dialect.name != "sqlite" for engine in user_engines):
+        raise ValueError("User shards must be SQLite databases")
+
+    shard_count = len(user_engines)
+    shards = {str(i): user_engine for i, user_engine in enumerate(user_engines)}
+    # Reuse the shard on the same engine for other tables, so one commit never holds two
+    # connections (and two SQLite write locks) on the same database
+    primary = next((shard_id for shard_id, engine in shards.items() if engine is primary_engine), "primary")
+    shards.setdefault(primary, primary_engine)
+    all_user_shards = [str(i) for i in range(shard_count)]
+
+    def shard_chooser(mapper, instance, clause=None):
+        if not _is_user_mapper(mapper):
+            return primary
+        if instance is not None and isinstance(instance.id, int):
+            return str(shard_for_user_id(instance.id))
+        if instance is not None and instance.email is not None:
+            return str(shard_for_email(instance.email, shard_count))
+        return all_user_shards[0]
+
+    def identity_chooser(mapper, primary_key, **kw):
+        if not _is_user_mapper(mapper):
+            return [primary]
+        return [str(shard_for_user_id(primary_key[0]))]
+
+    def execute_chooser(context):
+        if not _is_user_mapper(context.bind_mapper):
+            return [primary]
+        named = _shards_from_criteria(getattr(context.statement, "whereclause", None), shard_count)
+        return [str(shard) for shard in sorted(named)] if named else all_user_shards
+
+    kwargs.setdefault("info", {})["user_shards"] = all_user_shards
+    return sessionmaker(
+        class_=ShardedSession,
+        shards=shards,
+        shard_chooser=shard_chooser,
+        identity_chooser=identity_chooser,
+        execute_chooser=execute_chooser,
+        **kwargs,
+    )
+
+def create_user_tables(user_engines: list):
+    """
+    Creates the users table and its indexes on every shard that lacks them.
+    """
+    from app.models import User
+
+    for engine in dict.fromkeys(user_engines):
+        User.__table__.create(bind=engine, checkfirst=True)
+        for index in User.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+# --- Rebalancing ---
+
+# Planned moves, written to the events database before any user row changes and deleted once
+# the move is complete, so a rerun after an interruption finishes exactly the moves it started
+user_id_moves = Table(
+    "user_id_moves",
+    MetaData(),
+    Column("old_id", Integer, primary_key=True),
+    Column("new_id", Integer, nullable=False),
+    Column("email", String, nullable=False),
+)
+
+def _rewrite_event_user_ids(events_engine, mapping: dict):
+    from app.models import Event
+
+    if not inspect(events_engine).has_table(Event.__tablename__):
+        return
+    events = Event.__table__
+    with events_engine.begin() as conn:
+        # events.user_id isn't indexed, so rewrite the whole batch in one scan
+        conn.execute(
+            events.update()
+            .where(events.c.user_id.in_(list(mapping)))
+            .values(user_id=case(mapping, value=events.c.user_id))
+        )
+
+def _apply_moves(moves: list, engines: list, target_engines: list, events_engine):
+    """
+    Carries out logged (old_id, new_id, email) moves. Each step checks what is already done,
+    so the whole thing can be repeated after an interruption at any point.
+    """
+    from app.models import User
+
+    users = User.__table__
+    for old_id, new_id, email in moves:
+        target = target_engines[shard_for_user_id(new_id)]
+        with target.begin() as conn:
+            current_id = conn.scalar(select(users.c.id).where(users.c.email == email))
+            if current_id == old_id:
+                # Staying in the same database under a new id
+                conn.execute(users.update().where(users.c.id == old_id).values(id=new_id))
+            elif current_id is None:
+                for engine in engines:
+                    if engine is target:
+                        continue
+                    with engine.connect() as source:
+                        row = source.execute(
+                            select(users).where(users.c.id == old_id, users.c.email == email)
+                        ).mappings().first()
+                    if row is not None:
+                        conn.execute(users.insert().values({**row, "id": new_id}))
+                        break
+
+    # Only once every user is reachable under the new id: events, then the old rows, then the log
+    _rewrite_event_user_ids(events_engine, {old_id: new_id for old_id, new_id, _ in moves})
+    for old_id, new_id, email in moves:
+        target = target_engines[shard_for_user_id(new_id)]
+        for engine in engines:
+            if engine is not target:
+                with engine.begin() as conn:
+                    conn.execute(users.delete().where(users.c.id == old_id, users.c.email == email))
+    with events_engine.begin() as conn:
+        conn.execute(user_id_moves.delete().where(user_id_moves.c.old_id.in_([old_id for old_id, _, _ in moves])))
+
+def rebalance(source_engines: list, target_engines: list, events_engine, batch_size: int = 1000) -> dict:
+    """
+    Moves every user in `source_engines` to the shard of `target_engines` its email hashes to,
+    giving moved users an id in their new shard's range and rewriting events.user_id to match.
+    Run it with the app stopped. Each batch of moves is logged in `user_id_moves` on the events
+    database before any row changes, and a rerun first finishes whatever is still logged, so an
+    interrupted run can simply be repeated.
+
+    Returns {old_id: new_id} for every user whose id changed.
+    """
+    from app.models import User
+
+    users = User.__table__
+    create_user_tables(target_engines)
+    user_id_moves.create(bind=events_engine, checkfirst=True)
+    engines = list(dict.fromkeys([*source_engines, *target_engines]))
+    shard_count = len(target_engines)
+    next_ids = {}
+    id_changes = {}
+
+    with events_engine.connect() as conn:
+        pending = [tuple(row) for row in conn.execute(select(user_id_moves).order_by(user_id_moves.c.old_id))]
+    for start in range(0, len(pending), batch_size):
+        _apply_moves(pending[start:start + batch_size], engines, target_engines, events_engine)
+    id_changes.update((old_id, new_id) for old_id, new_id, _ in pending)
+
+    def allocate(shard: int) -> int:
+        if shard not in next_ids:
+            floor, ceiling = user_id_range(shard)
+            with target_engines[shard].connect() as conn:
+                highest = conn.scalar(select(func.max(users.c.id)).where(users.c.id > floor, users.c.id < ceiling))
+            next_ids[shard] = (highest or floor) + 1
+        next_ids[shard] += 1
+        return next_ids[shard] - 1
+
+    for source in dict.fromkeys(source_engines):
+        if not inspect(source).has_table(USERS_TABLE):
+            continue
+        last_id = 0
+        while True:
+            with source.connect() as conn:
+                rows = conn.execute(
+                    select(users.c.id, users.c.email).where(users.c.id > last_id).order_by(users.c.id).limit(batch_size)
+                ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            moves = []
+            for row in rows:
+                shard = shard_for_email(row.email, shard_count)
+                if target_engines[shard] is source and shard_for_user_id(row.id) == shard:
+                    continue
+                moves.append((row.id, allocate(shard), row.email))
+            if not moves:
+                continue
+
+            with events_engine.begin() as conn:
+                conn.execute(user_id_moves.insert(), [
+                    {"old_id": old_id, "new_id": new_id, "email": email} for old_id, new_id, email in moves
+                ])
+            _apply_moves(moves, engines, target_engines, events_engine)
+            id_changes.update((old_id, new_id) for old_id, new_id, _ in moves)
+    return id_changes
+
+def main():
+    from app.database import DATABASE_URL, create_engine_for_url
+    from app.utils.structured_logging import setup_logging, shutdown_logging
+
+    parser = argparse.ArgumentParser(description="Manage hash-sharded user storage.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebalance_parser = subparsers.add_parser("rebalance", help="Move users to the shards of a new shard list")
+    rebalance_parser.add_argument("--from", dest="source", required=True, help="Comma-separated current shard URLs")
+    rebalance_parser.add_argument("--to", dest="target", required=True, help="Comma-separated new shard URLs, in order")
+    rebalance_parser.add_argument("--events-url", default=DATABASE_URL, help="Database holding the events table")
+    rebalance_parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    # The same URL in several places means the same database, so it gets one engine
+    engines = {}
+    def engines_for(urls: str) -> list:
+        selected = []
+        for url in filter(None, (url.strip() for url in urls.split(","))):
+            if url not in engines:
+                engines[url] = create_engine_for_url(url)
+            selected.append(engines[url])
+        return selected
+
+    setup_logging()
+    try:
+        id_changes = rebalance(
+            engines_for(args.source), engines_for(args.target), engines_for(args.events_url)[0], args.batch_size
+        )
+        logger.info("Rebalanced user shards", extra={"moved_users": len(id_changes)})
+    finally:
+        shutdown_logging()
+
+if __name__ == "__main__":
+    main()
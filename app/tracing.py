@@ -0,0 +1,399 @@
+import json
+import logging
+import os
+import queue
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Span of the code currently executing; children pick their trace/parent from it.
+_current_span: ContextVar = ContextVar("current_span", default=None)
+
+# Tracing is off (and spans are never built) until an exporter is installed.
+_exporter = None
+
+logger = logging.getLogger(__name__)
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_ns", "end_ns", "status")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str = None, attributes: dict = None, start_ns: int = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1_000_000
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+# --- Exporters ---
+
+class InMemoryExporter:
+    """
+    Keeps finished spans in a list. Intended for tests and local debugging.
+    """
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def names(self) -> list:
+        with self._lock:
+            return [span.name for span in self.spans]
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def shutdown(self):
+        pass
+
+class JSONExporter:
+    """
+    Writes one JSON object per finished span to a file path or stream (default: stderr).
+    """
+    def __init__(self, path: str = None, stream=None):
+        self._stream = open(path, "a", encoding="utf-8") if path else (stream or sys.stderr)
+        self._owns_stream = path is not None
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+    def shutdown(self):
+        if self._owns_stream:
+            self._stream.close()
+
+class OTLPHTTPExporter:
+    """
+    Ships spans to an OpenTelemetry collector using the OTLP/HTTP JSON protocol.
+
+    Spans are queued and sent in batches from a daemon thread so request handlers never
+    wait on the collector.
+    """
+    def __init__(self, endpoint: str, service_name: str = "auth-api", batch_size: int = 256, interval: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=batch_size * 32)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            # Dropping spans is preferable to blocking a request on a slow collector.
+            pass
+
+    def shutdown(self):
+        self._stopped.set()
+        self._thread.join(timeout=self.interval * 2)
+
+    def _run(self):
+        while not self._stopped.is_set() or not self._queue.empty():
+            batch = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch: list):
+        import httpx
+
+        try:
+            httpx.post(self.url, json=otlp_payload(batch, self.service_name), timeout=5.0)
+        except httpx.HTTPError as e:
+            logger.warning("Error exporting spans", extra={"error": str(e), "spans": len(batch)})
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def _otlp_span(span: Span) -> dict:
+    otlp_span = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 1,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns),
+        "attributes": [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+        "status": {"code": 2 if span.status == "error" else 1},
+    }
+    if span.parent_id:
+        otlp_span["parentSpanId"] = span.parent_id
+    return otlp_span
+
+def otlp_payload(batch: list, service_name: str) -> dict:
+    """
+    Builds an OTLP/HTTP JSON `ExportTraceServiceRequest` body for a batch of spans.
+    """
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [_otlp_span(span) for span in batch],
+            }],
+        }]
+    }
+
+def set_exporter(exporter):
+    """
+    Installs the exporter that receives finished spans. Passing None disables tracing.
+    """
+    global _exporter
+    previous = _exporter
+    _exporter = exporter
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
+
+def get_exporter():
+    return _exporter
+
+def configure_from_env():
+    """
+    Installs an exporter based on TRACING_EXPORTER ("memory", "json" or "otlp").
+    """
+    kind = os.getenv("TRACING_EXPORTER", "").lower()
+    if kind == "memory":
+        set_exporter(InMemoryExporter())
+    elif kind == "json":
+        set_exporter(JSONExporter(path=os.getenv("TRACING_JSON_PATH")))
+    elif kind == "otlp":
+        endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+        service_name = os.getenv("OTEL_SERVICE_NAME", "auth-api")
+        set_exporter(OTLPHTTPExporter(endpoint, service_name=service_name))
+
+# --- Span API ---
+
+def current_span():
+    return _current_span.get()
+
+def current_trace_id():
+    active = _current_span.get()
+    return active.trace_id if active else None
+
+def start_span(name: str, attributes: dict = None, trace_id: str = None, parent_id: str = None, start_ns: int = None):
+    """
+    Creates a span under the current one without activating it. Returns None when tracing is off.
+    """
+    if _exporter is None:
+        return None
+    parent = _current_span.get()
+    if trace_id is None:
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        parent_id = parent.span_id if parent else None
+    return Span(name, trace_id, parent_id, attributes, start_ns)
+
+def end_span(span: Span, error: BaseException = None):
+    if span is None:
+        return
+    span.end_ns = time.time_ns()
+    if error is not None:
+        span.status = "error"
+        span.set_attribute("error.type", type(error).__name__)
+    exporter = _exporter
+    if exporter is not None:
+        exporter.export(span)
+
+@contextmanager
+def span(name: str, attributes: dict = None, trace_id: str = None, parent_id: str = None):
+    active = start_span(name, attributes, trace_id, parent_id)
+    if active is None:
+        yield None
+        return
+    token = _current_span.set(active)
+    error = None
+    try:
+        yield active
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        end_span(active, error)
+
+def traced(name: str):
+    """
+    Decorator that wraps every call of the function in a span called `name`.
+    """
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _exporter is None:
+                    return await func(*args, **kwargs)
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# --- Framework integration ---
+
+def _parse_traceparent(value: str):
+    """
+    Extracts (trace_id, parent_span_id) from a W3C `traceparent` header.
+    """
+    parts = value.split("-") if value else []
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    return parts[1], parts[2]
+
+class TracingMiddleware:
+    """
+    Opens the root span for every HTTP request, continuing an incoming `traceparent` if present.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _exporter is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id, parent_id = _parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+
+        with span(f"{scope['method']} {scope['path']}", attributes, trace_id, parent_id) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+def _trace_endpoint(endpoint):
+    """
+    Wraps a route endpoint so the time FastAPI spent resolving dependencies and validating the
+    request before calling it is recorded as its own span.
+    """
+    name = f"endpoint.{endpoint.__name__}"
+
+    def record_dependencies():
+        route_span = _current_span.get()
+        if route_span is not None:
+            end_span(start_span("fastapi.dependencies", start_ns=route_span.start_ns))
+
+    if iscoroutinefunction(endpoint):
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            if _exporter is None:
+                return await endpoint(*args, **kwargs)
+            record_dependencies()
+            with span(name):
+                return await endpoint(*args, **kwargs)
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        if _exporter is None:
+            return endpoint(*args, **kwargs)
+        record_dependencies()
+        with span(name):
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+class TracedRoute(APIRoute):
+    """
+    Route class that records a span for the route handler (dependency resolution, validation,
+    endpoint and serialisation) plus the endpoint body on its own.
+    """
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _trace_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        name = f"route {self.path}"
+
+        async def traced_handler(request):
+            if _exporter is None:
+                return await handler(request)
+            with span(name):
+                return await handler(request)
+
+        return traced_handler
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _exporter is not None:
+        context._trace_span = start_span("db.statement", {"db.statement": statement})
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    end_span(getattr(context, "_trace_span", None))
+    context._trace_span = None
+
+def _handle_error(exception_context):
+    context = exception_context.execution_context
+    if context is not None:
+        end_span(getattr(context, "_trace_span", None), exception_context.original_exception)
+        context._trace_span = None
+
+def instrument_sqlalchemy():
+    """
+    Records a span for every SQL statement executed by any engine.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,23 @@
+import hashlib
+
+from app.models import User
+
+def user_etag(user: User) -> str:
+    """
+    Strong ETag for a user's profile. Changes whenever the row is updated or the password is reset.
+    """
+    version = f"{user.id}:{user.updated_at}:{user.last_password_reset}"
+    return '"' + hashlib.sha256(version.encode()).hexdigest()[:32] + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Checks an If-None-Match header (which may list several tags, or be "*") against an ETag.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses weak comparison, so W/ prefixes are ignored
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
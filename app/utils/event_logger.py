@@ -1,16 +1,129 @@
+import asyncio
+import logging
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
 from sqlalchemy.orm import Session
 from app.models import Event
-from app.database import get_db
+from app.database import SessionLocal
+from app.tracing import current_trace_id, traced
+
+# High-frequency events counted in memory per (user_id, endpoint, minute) and written as one
+# rollup row with a "count", instead of one row per call
+ROLLUP_EVENTS = {"protected_route_accessed"}
+
+# Events kept for only a fraction of calls: event name -> sample rate. Written rows carry the
+# rate in their metadata so counts can be scaled back up.
+SAMPLED_EVENTS = {}
+
+# Every other event (login failures, resets, ...) is written individually.
+
+ROLLUP_FLUSH_INTERVAL_SECONDS = 15
+ROLLUP_MAX_KEYS = 10_000  # flush early if this many distinct keys are pending
 
+_rollups = Counter()
+_rollups_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+@traced("events.record_event")
 def record_event(event_name: str, user_id: int = None, metadata: dict = None):
-    db: Session = next(get_db())
-    event = Event(
-        event_name=event_name,
-        user_id=user_id,
-        event_metadata=metadata or {}
-    )
-    db.add(event)
-    db.commit()
+    if event_name in ROLLUP_EVENTS:
+        _add_to_rollup(event_name, user_id, metadata)
+        return
+
+    metadata = dict(metadata or {})
+
+    sample_rate = SAMPLED_EVENTS.get(event_name)
+    if sample_rate is not None:
+        if random.random() >= sample_rate:
+            return
+        metadata["sample_rate"] = sample_rate
+
+    # Link the event to the request that produced it
+    trace_id = current_trace_id()
+    if trace_id:
+        metadata["trace_id"] = trace_id
+
+    _write_events([
+        Event(
+            event_name=event_name,
+            user_id=user_id,
+            event_metadata=metadata
+        )
+    ])
+
+def _write_events(events: list):
+    db: Session = SessionLocal()
+    try:
+        db.add_all(events)
+        db.commit()
+    finally:
+        db.close()
+
+def _add_to_rollup(event_name: str, user_id: int, metadata: dict):
+    minute = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    key = (event_name, user_id, (metadata or {}).get("endpoint"), minute)
+
+    with _rollups_lock:
+        _rollups[key] += 1
+        too_many_keys = len(_rollups) >= ROLLUP_MAX_KEYS
+
+    if too_many_keys:
+        flush_rollups(include_current=True)
+
+def flush_rollups(include_current: bool = False) -> int:
+    """
+    Writes pending rollups as one event row per key. Buckets for the current minute are
+    kept in memory unless include_current is set. Returns the number of rows written.
+    """
+    current_minute = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+    with _rollups_lock:
+        ready = {
+            key: count for key, count in _rollups.items()
+            if include_current or key[3] < current_minute
+        }
+        for key in ready:
+            del _rollups[key]
+
+    if not ready:
+        return 0
+
+    try:
+        _write_events([
+            Event(
+                event_name=event_name,
+                user_id=user_id,
+                event_metadata={
+                    "endpoint": endpoint,
+                    "count": count,
+                    "window_start": minute.isoformat(),
+                    "rollup": True,
+                },
+                created_at=minute,
+            )
+            for (event_name, user_id, endpoint, minute), count in ready.items()
+        ])
+    except Exception:
+        # Put the counts back (adding to any that arrived meanwhile) so the next flush retries them
+        with _rollups_lock:
+            _rollups.update(ready)
+        raise
+    return len(ready)
+
+async def run_rollup_flusher(interval: float = ROLLUP_FLUSH_INTERVAL_SECONDS):
+    """
+    Background loop started from the app lifespan; writes closed rollup windows every interval.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(flush_rollups)
+        except Exception:
+            logger.exception("Error flushing event rollups")
 
 def mask_email(email: str) -> str:
     if not email or "@" not in email:
@@ -18,4 +131,4 @@ def mask_email(email: str) -> str:
     local, domain = email.split("@")
     if len(local) > 1:
         return local[0] + "***@" + domain
-    return "***@" + domain
\ No newline at end of file
+    return "***@" + domain
@@ -0,0 +1,23 @@
+import base64
+import binascii
+import json
+
+def encode_cursor(*values) -> str:
+    """
+    Packs the keyset values of the last row on a page into an opaque, URL-safe cursor.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """
+    Inverse of encode_cursor. Raises ValueError for cursors it didn't produce.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,165 @@
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from app.tracing import current_trace_id
+from app.utils.event_logger import mask_email
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))
+LOG_REDACT = os.getenv("LOG_REDACT", "true").lower() not in ("0", "false", "no")
+
+# Noisy messages logged for only a fraction of calls, e.g.
+# LOG_SAMPLE_RATES="Verification email sent=0.1,Password reset email sent=0.1"
+LOG_SAMPLE_RATES = {
+    message.strip(): float(rate)
+    for message, rate in (
+        item.rsplit("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item
+    )
+}
+
+REDACTED = "[REDACTED]"
+SECRET_FIELDS = {"token", "reset_token", "reset_link", "verification_link", "password", "access_token", "refresh_token"}
+
+_JWT_PATTERN = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+")
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample_rate"}
+
+def redact(value):
+    if isinstance(value, str):
+        value = _JWT_PATTERN.sub(REDACTED, value)
+        return _EMAIL_PATTERN.sub(lambda match: mask_email(match.group(0)), value)
+    if isinstance(value, dict):
+        return {key: REDACTED if key in SECRET_FIELDS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message, then any `extra=` fields.
+    """
+    def __init__(self, redact_secrets: bool = LOG_REDACT):
+        super().__init__()
+        self.redact_secrets = redact_secrets
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+
+        if self.redact_secrets:
+            entry = redact(entry)
+        return json.dumps(entry, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops a share of records whose message template is listed in `rates`, or that carry a
+    `sample_rate` passed through `extra=`. Warnings and errors are never sampled.
+    """
+    def __init__(self, rates: dict = None):
+        super().__init__()
+        self.rates = LOG_SAMPLE_RATES if rates is None else rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = getattr(record, "sample_rate", None)
+        if rate is None:
+            rate = self.rates.get(record.msg)
+        return rate is None or random.random() < rate
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that drops records instead of blocking or erroring when the queue is full.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now, while they still hold their current values, but leave the JSON
+        # formatting (and redaction) to the listener thread. The base class would fold the
+        # traceback into the message instead of keeping it in its own field.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        # The span context lives in the calling thread, so capture the trace ID here
+        if getattr(record, "trace_id", None) is None:
+            trace_id = current_trace_id()
+            if trace_id:
+                record.trace_id = trace_id
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_traceback_formatter = logging.Formatter()
+_listener = None
+
+def setup_logging(stream=None, level: str = LOG_LEVEL, queue_size: int = LOG_QUEUE_SIZE) -> QueueListener:
+    """
+    Routes the `app` loggers through a bounded queue to a background thread that writes JSON
+    lines to `stream` (default: stdout), so logging never blocks a request on a slow pipe.
+    Modules that can also run as `python -m` scripts name their logger explicitly ("app.x"):
+    there `__name__` is "__main__", which is outside the `app` logger.
+    """
+    global _listener
+    shutdown_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(SamplingFilter())
+
+    logger = logging.getLogger("app")
+    for existing in list(logger.handlers):
+        logger.removeHandler(existing)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def shutdown_logging():
+    """
+    Stops the background writer after flushing everything queued so far, and detaches the
+    `app` loggers from its queue so later records reach the standard handlers instead of
+    filling a queue nobody reads.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logger = logging.getLogger("app")
+        for existing in list(logger.handlers):
+            if isinstance(existing, NonBlockingQueueHandler):
+                logger.removeHandler(existing)
+        logger.propagate = True
@@ -2,15 +2,19 @@ import os
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 
+from app.tracing import traced
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 
+@traced("jwt.create_email_verification_token")
 def create_email_verification_token(email: str):
     expire = datetime.now(timezone.utc) + timedelta(hours=1)
     to_encode = {"sub": email, "exp": expire}
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+@traced("jwt.verify_email_verification_token")
 def verify_email_verification_token(token: str):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
@@ -0,0 +1,106 @@
+"""
+Measures user lookup, token verification, admin listing and event write/query latency as the
+dataset grows.
+
+    python -m benchmarks.bench_scale --url sqlite:///./bench.db --steps 10000,100000,1000000,10000000
+
+At each step the database is grown to that many users (and --events-per-user events per new
+user) with benchmarks.generate_dataset, then every operation is sampled --samples times.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("SECRET_KEY", "benchmark-secret")
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+from app import crud
+from app.jwt_handler import create_access_token, verify_token
+from app.models import Event, User
+from benchmarks.generate_dataset import build_hash_pool, generate, make_engine, user_email
+
+def _percentiles(timings: list) -> dict:
+    timings = sorted(timings)
+    def pick(p):
+        return timings[min(len(timings) - 1, int(len(timings) * p))] * 1000
+    return {"p50": statistics.median(timings) * 1000, "p95": pick(0.95), "p99": pick(0.99)}
+
+def _time(Session, samples: int, operation) -> dict:
+    timings = []
+    for _ in range(samples):
+        db = Session()
+        try:
+            started = time.perf_counter()
+            operation(db)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return _percentiles(timings)
+
+def measure(engine, user_count: int, samples: int = 500, seed: int = 0) -> dict:
+    """
+    Samples each operation against the current dataset; returns {operation: {p50, p95, p99}} in ms.
+    """
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    rng = random.Random(seed)
+
+    db = Session()
+    tokens = [
+        create_access_token({"user_id": user.id, "last_password_reset": str(user.last_password_reset)})
+        for user in db.query(User).filter(User.id.in_([rng.randrange(1, user_count + 1) for _ in range(samples)]))
+    ]
+    # Keyset position ~90% of the way through the newest-first admin listing
+    deep = crud.list_users(db, 1).offset(int(user_count * 0.9)).first()
+    deep_after = (deep.created_at_key, deep.id)
+    db.close()
+
+    month_ago = datetime.now(timezone.utc) - timedelta(days=30)
+    day_ago = datetime.now(timezone.utc) - timedelta(days=1)
+
+    return {
+        "get_user_by_email (hit)": _time(Session, samples, lambda db: crud.get_user_by_email(db, user_email(rng.randrange(user_count)))),
+        "get_user_by_email (miss)": _time(Session, samples, lambda db: crud.get_user_by_email(db, f"missing{rng.random()}@example.com")),
+        "verify_token": _time(Session, samples, lambda db: verify_token(rng.choice(tokens), db)),
+        "admin users page (first)": _time(Session, samples, lambda db: crud.list_users(db, 50).all()),
+        "admin users page (deep)": _time(Session, samples, lambda db: crud.list_users(db, 50, deep_after).all()),
+        "event insert": _time(Session, samples, lambda db: (
+            db.add(Event(event_name="protected_route_accessed", user_id=rng.randrange(1, user_count + 1), event_metadata={"endpoint": "/protected"})),
+            db.commit(),
+        )),
+        "user events (30 days)": _time(Session, samples, lambda db: db.query(Event).filter(
+            Event.user_id == rng.randrange(1, user_count + 1), Event.created_at >= month_ago
+        ).all()),
+        "event counts (1 day)": _time(Session, max(1, samples // 50), lambda db: db.query(Event.event_name, func.count()).filter(
+            Event.created_at >= day_ago
+        ).group_by(Event.event_name).all()),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark auth queries as the users/events tables grow.")
+    parser.add_argument("--url", default="sqlite:///./bench.db", help="Database URL (should start empty)")
+    parser.add_argument("--steps", default="10000,100000,1000000", help="Comma-separated user counts")
+    parser.add_argument("--events-per-user", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = make_engine(args.url)
+    hash_pool = build_hash_pool()
+    user_count = 0
+
+    for step in [int(s) for s in args.steps.split(",")]:
+        new_users = step - user_count
+        generate(engine, new_users, new_users * args.events_per_user, start_user=user_count, hash_pool=hash_pool)
+        user_count = step
+
+        print(f"\n{user_count:,} users, ~{user_count * args.events_per_user:,} events")
+        print(f"{'operation':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for operation, result in measure(engine, user_count, args.samples).items():
+            print(f"{operation:<28}{result['p50']:>10.3f}{result['p95']:>10.3f}{result['p99']:>10.3f}")
+
+if __name__ == "__main__":
+    main()
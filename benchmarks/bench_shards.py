@@ -0,0 +1,170 @@
+"""
+Measures how user write throughput scales as the users table is spread over more SQLite shards.
+
+    python -m benchmarks.bench_shards --shards 1,2,4,8 --writers 8 --registrations 4000
+
+For each shard count a fresh set of database files is created and --writers processes (like
+uvicorn workers) run the writes behind /register and /verify-email: the shard-routed INSERT
+that crud.insert_user issues, then the UPDATE marking the user verified, each in its own
+transaction committed with synchronous=FULL.
+
+--mode session runs them through make_sessionmaker and crud.insert_user, exactly as the app
+does. The default --mode sql executes the same statements, compiled from the app's models and
+crud.next_user_id, on raw sqlite3 connections that take the writer lock up front (BEGIN
+IMMEDIATE), leaving out the ORM's per-call overhead so each write is bound by its commit under
+the writer lock. That lock is exactly what sharding splits: one file lets a single commit
+through at a time, N files let N through.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, create_engine, event, insert, update
+from sqlalchemy.dialects import sqlite
+
+from app import crud, sharding
+from app.models import User
+from benchmarks.generate_dataset import build_hash_pool, user_email
+
+MODES = ("sql", "session")
+
+def _compile(statement):
+    compiled = statement.compile(dialect=sqlite.dialect(paramstyle="named"))
+    return str(compiled), compiled.params
+
+# The statements crud.insert_user and /verify-email issue, with their literal parameters
+INSERT_USER = _compile(
+    insert(User)
+    .values(
+        id=crud.next_user_id(bindparam("floor"), bindparam("ceiling")),
+        email=bindparam("email"),
+        hashed_password=bindparam("hashed_password"),
+        is_verified=False,
+        last_password_reset=bindparam("now"),
+    )
+    .returning(User.id)
+)
+VERIFY_USER = _compile(
+    update(User).where(User.id == bindparam("user_id")).values(is_verified=True, verified_at=bindparam("now"))
+)
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+    conn.execute("PRAGMA synchronous=FULL")
+    return conn
+
+def _write(conn: sqlite3.Connection, statement: tuple, params: dict):
+    sql, defaults = statement
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(sql, {**defaults, **params}).fetchone()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+def _sql_writer(paths: list, offsets: range, hashed_password: str, start):
+    connections = [_connect(path) for path in paths]
+    start.wait()
+    try:
+        for i in offsets:
+            email = user_email(i)
+            floor, ceiling = sharding.user_id_range(sharding.shard_for_email(email, len(paths)))
+            now = datetime.now(timezone.utc).isoformat()
+            (user_id,) = _write(connections[sharding.shard_for_user_id(floor)], INSERT_USER, {
+                "floor": floor, "ceiling": ceiling, "email": email, "hashed_password": hashed_password, "now": now,
+            })
+            _write(connections[sharding.shard_for_user_id(user_id)], VERIFY_USER, {"user_id": user_id, "now": now})
+    finally:
+        for conn in connections:
+            conn.close()
+
+def _synchronous_full(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA synchronous=FULL")
+
+def _session_writer(paths: list, offsets: range, hashed_password: str, start):
+    engines = [create_engine(f"sqlite:///{path}", connect_args={"timeout": 60}) for path in paths]
+    for engine in engines:
+        event.listen(engine, "connect", _synchronous_full)
+    Session = sharding.make_sessionmaker(engines[0], engines, autoflush=False, expire_on_commit=False)
+    start.wait()
+    try:
+        for i in offsets:
+            db = Session()
+            try:
+                user = crud.insert_user(db, user_email(i), hashed_password)
+                user.is_verified = True
+                user.verified_at = datetime.now(timezone.utc)
+                db.commit()
+            finally:
+                db.close()
+    finally:
+        for engine in engines:
+            engine.dispose()
+
+def _writer(mode: str, paths: list, offsets: range, hashed_password: str, start, errors):
+    try:
+        (_session_writer if mode == "session" else _sql_writer)(paths, offsets, hashed_password, start)
+    except Exception as e:
+        errors.put(repr(e))
+
+def measure(paths: list, registrations: int, writers: int, hashed_password: str, mode: str = "sql") -> dict:
+    """
+    Registers and verifies `registrations` users across the shard files at `paths` from
+    `writers` processes, in one of MODES; returns the elapsed seconds and writes per second.
+    """
+    engines = [create_engine(f"sqlite:///{path}") for path in paths]
+    sharding.create_user_tables(engines)
+    for engine in engines:
+        engine.dispose()
+
+    start = multiprocessing.Barrier(writers + 1)
+    errors = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=_writer, args=(mode, paths, range(offset, registrations, writers), hashed_password, start, errors)
+        )
+        for offset in range(writers)
+    ]
+    for process in processes:
+        process.start()
+    start.wait()
+    started = time.perf_counter()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    if not errors.empty():
+        raise RuntimeError(errors.get())
+    return {"seconds": elapsed, "writes_per_second": registrations * 2 / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark user write throughput by shard count.")
+    parser.add_argument("--shards", default="1,2,4,8", help="Comma-separated shard counts")
+    parser.add_argument("--writers", type=int, default=8, help="Concurrent writer processes")
+    parser.add_argument("--registrations", type=int, default=4000)
+    parser.add_argument("--mode", choices=MODES, default="sql", help="Raw compiled statements or the app's sharded sessions")
+    parser.add_argument("--dir", default=None, help="Where to create the shard files (default: a temp dir)")
+    args = parser.parse_args()
+
+    hashed_password = build_hash_pool(size=1, rounds=4)[0]
+    baseline = None
+
+    print(f"{'shards':>6}{'seconds':>10}{'writes/s':>12}{'speedup':>10}")
+    for shard_count in [int(s) for s in args.shards.split(",")]:
+        with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+            paths = [os.path.join(directory, f"users{shard}.db") for shard in range(shard_count)]
+            result = measure(paths, args.registrations, args.writers, hashed_password, args.mode)
+        baseline = baseline or result["writes_per_second"]
+        print(
+            f"{shard_count:>6}{result['seconds']:>10.2f}{result['writes_per_second']:>12.0f}"
+            f"{result['writes_per_second'] / baseline:>9.2f}x"
+        )
+
+if __name__ == "__main__":
+    main()
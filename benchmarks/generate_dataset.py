@@ -0,0 +1,187 @@
+"""
+Bulk-loads synthetic users and events for scale testing.
+
+    python -m benchmarks.generate_dataset --url sqlite:///./bench.db --users 10000000 --events 500000000
+
+Users get real bcrypt hashes of BENCHMARK_PASSWORD (a small pool is hashed once and reused,
+since hashing every row would take days), a verified/unverified mix and creation dates spread
+over the last year. Events follow the event names the API records.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.engine import Engine
+
+from app.models import Base, Event, User
+from app.utils.event_logger import mask_email
+
+BENCHMARK_PASSWORD = "Benchmark123"
+DOMAINS = ["example.com", "mail.test", "corp.example", "inbox.test", "users.example"]
+VERIFIED_RATIO = 0.8
+HASH_POOL_SIZE = 16
+
+# Rough production mix: protected_route_accessed dominates, security events are rare
+EVENT_WEIGHTS = {
+    "protected_route_accessed": 80,
+    "user_login_success": 10,
+    "user_login_failure": 4,
+    "user_registered": 2,
+    "email_verified": 2,
+    "password_reset_requested": 1,
+    "password_reset_completed": 1,
+}
+
+def user_email(i: int) -> str:
+    return f"user{i:09d}@{DOMAINS[i % len(DOMAINS)]}"
+
+def build_hash_pool(size: int = HASH_POOL_SIZE, rounds: int = 12) -> list:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+    return [context.hash(BENCHMARK_PASSWORD) for _ in range(size)]
+
+def user_rows(start: int, count: int, hash_pool: list, rng: random.Random, now: datetime):
+    for i in range(start, start + count):
+        created_at = now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        is_verified = rng.random() < VERIFIED_RATIO
+        yield {
+            "id": i + 1,
+            "email": user_email(i),
+            "hashed_password": hash_pool[i % len(hash_pool)],
+            "is_verified": is_verified,
+            "created_at": created_at,
+            "verified_at": created_at + timedelta(minutes=rng.randrange(1, 120)) if is_verified else None,
+            "last_password_reset": created_at,
+        }
+
+def event_rows(count: int, user_count: int, rng: random.Random, now: datetime):
+    names = list(EVENT_WEIGHTS)
+    cum_weights = list(itertools.accumulate(EVENT_WEIGHTS.values()))
+    for _ in range(count):
+        # One draw per row keeps memory flat for hundreds of millions of events
+        name = rng.choices(names, cum_weights=cum_weights)[0]
+        user_index = rng.randrange(user_count)
+        if name == "protected_route_accessed":
+            metadata = {"endpoint": "/protected"}
+        else:
+            metadata = {"email": mask_email(user_email(user_index))}
+        yield {
+            "event_name": name,
+            "user_id": user_index + 1,
+            "event_metadata": metadata,
+            "created_at": now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+        }
+
+def _tune_sqlite_for_load(dbapi_connection, connection_record):
+    # Durability is not needed while bulk loading; these cut load time several-fold
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA cache_size=-262144")
+    cursor.close()
+
+def make_engine(url: str) -> Engine:
+    if url.startswith("sqlite"):
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(engine, "connect", _tune_sqlite_for_load)
+        return engine
+    return create_engine(url)
+
+def _copy_rows(engine: Engine, table, rows: list):
+    """
+    Loads rows into Postgres with COPY, which is far faster than multi-row INSERTs.
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_csv_value(row[c]) for c in columns])
+    buffer.seek(0)
+
+    db_columns = ", ".join(table.c[c].name for c in columns)
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.copy_expert(f"COPY {table.name} ({db_columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        raw.commit()
+    finally:
+        raw.close()
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+def _insert_rows(engine: Engine, model, rows: list):
+    if engine.dialect.name == "postgresql":
+        _copy_rows(engine, model.__table__, rows)
+        return
+    with engine.begin() as conn:
+        conn.execute(insert(model), rows)
+
+def _load(engine: Engine, model, rows, total: int, chunk_size: int, label: str):
+    started = time.perf_counter()
+    loaded = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            _insert_rows(engine, model, chunk)
+            loaded += len(chunk)
+            chunk = []
+            rate = loaded / (time.perf_counter() - started)
+            print(f"\r{label}: {loaded:,}/{total:,} ({rate:,.0f} rows/s)", end="", flush=True)
+    if chunk:
+        _insert_rows(engine, model, chunk)
+        loaded += len(chunk)
+    if total:
+        print(f"\r{label}: {loaded:,}/{total:,} in {time.perf_counter() - started:.1f}s")
+
+def generate(
+    engine: Engine,
+    users: int,
+    events: int,
+    start_user: int = 0,
+    chunk_size: int = 10_000,
+    seed: int = 0,
+    hash_pool: list = None,
+):
+    """
+    Appends `users` users (numbered from `start_user`) and `events` events spread over all
+    start_user + users users. Call repeatedly with growing start_user to build up a dataset.
+    """
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(seed + start_user)
+    now = datetime.now(timezone.utc)
+    hash_pool = hash_pool or build_hash_pool()
+
+    _load(engine, User, user_rows(start_user, users, hash_pool, rng, now), users, chunk_size, "users")
+    if engine.dialect.name == "postgresql":
+        # Rows carry explicit ids and COPY doesn't advance the sequence; move it past them so the
+        # app's next INSERT doesn't collide
+        with engine.begin() as conn:
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), max(id)) FROM users"))
+    _load(engine, Event, event_rows(events, start_user + users, rng, now), events, chunk_size, "events")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load synthetic users and events.")
+    parser.add_argument("--url", default="sqlite:///./bench.db", help="Database URL to load into")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--start-user", type=int, default=0, help="First user number, to append to an existing dataset")
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(make_engine(args.url), args.users, args.events, args.start_user, args.chunk_size, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,11 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
+from app import admin
 from app.main import app
 from app.models import Base
 from app.database import get_db
+from app.verification_token_handler import create_email_verification_token
 
 # Load environment variables
 load_dotenv()
@@ -23,7 +25,7 @@ API_KEY = os.getenv("API_KEY")
 engine = create_engine(
     os.environ["DATABASE_URL"], connect_args={"check_same_thread": False}
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 Base.metadata.create_all(bind=engine)
 
@@ -61,6 +63,23 @@ def mock_sendgrid_emails():
         mock_reset_email.return_value = None
         yield
 
+@pytest.fixture
+def admin_headers(monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_API_KEY", "test-admin-key")
+    return {"X-Admin-Key": "test-admin-key"}
+
+@pytest.fixture
+def login(client, auth_headers):
+    """
+    Registers, verifies and logs in a user; returns the token response.
+    """
+    def register_verify_and_login(email, password="Test1234"):
+        client.post("/register", json={"email": email, "password": password}, headers=auth_headers)
+        token = create_email_verification_token(email)
+        client.get(f"/verify-email?token={token}", headers=auth_headers)
+        return client.post("/login", json={"email": email, "password": password}, headers=auth_headers).json()
+    return register_verify_and_login
+
 @pytest.fixture
 def random_email():
     return f"testuser_{uuid.uuid4().hex[:8]}@example.com"
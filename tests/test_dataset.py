@@ -0,0 +1,27 @@
+from sqlalchemy.orm import sessionmaker
+
+from app.auth import verify_password
+from app.models import Event, User
+from benchmarks.bench_scale import measure
+from benchmarks.generate_dataset import BENCHMARK_PASSWORD, build_hash_pool, generate, make_engine
+
+def test_generate_dataset_and_measure(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'bench.db'}")
+    hash_pool = build_hash_pool(size=2, rounds=4)
+
+    generate(engine, users=200, events=1000, chunk_size=64, hash_pool=hash_pool)
+    generate(engine, users=100, events=500, start_user=200, chunk_size=64, hash_pool=hash_pool)
+
+    db = sessionmaker(bind=engine)()
+    users = db.query(User).all()
+    assert len(users) == 300
+    assert len({user.email for user in users}) == 300
+    assert 0 < sum(user.is_verified for user in users) < 300
+    assert all(user.hashed_password.startswith("$2b$04$") for user in users)
+    assert verify_password(BENCHMARK_PASSWORD, users[0].hashed_password)
+    assert db.query(Event).count() == 1500
+    db.close()
+
+    results = measure(engine, user_count=300, samples=10)
+    assert set(results) >= {"get_user_by_email (hit)", "verify_token", "event insert"}
+    assert all(result["p50"] > 0 for result in results.values())
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.models import Event
+from app.utils import event_logger
+from app.utils.event_logger import flush_rollups, record_event
+from tests.conftest import TestingSessionLocal
+
+@pytest.fixture(autouse=True)
+def clear_rollups():
+    event_logger._rollups.clear()
+    yield
+    event_logger._rollups.clear()
+
+def _events(event_name):
+    db = TestingSessionLocal()
+    events = db.query(Event).filter(Event.event_name == event_name).all()
+    db.close()
+    return events
+
+def test_protected_route_accesses_are_rolled_up(client, auth_headers, random_email, login):
+    tokens = login(random_email)
+    headers = {**auth_headers, "Authorization": f"Bearer {tokens['access_token']}"}
+
+    for _ in range(3):
+        assert client.get("/protected", headers=headers).status_code == 200
+
+    assert _events("protected_route_accessed") == []
+
+    flush_rollups(include_current=True)
+
+    rollups = _events("protected_route_accessed")
+    assert 1 <= len(rollups) <= 2  # the calls may straddle a minute boundary
+    assert sum(event.event_metadata["count"] for event in rollups) == 3
+    assert all(event.event_metadata["endpoint"] == "/protected" for event in rollups)
+    assert all(event.event_metadata["rollup"] for event in rollups)
+
+def test_flush_keeps_current_minute_in_memory():
+    record_event("protected_route_accessed", 1, {"endpoint": "/protected"})
+    past = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=2)
+    event_logger._rollups[("protected_route_accessed", 1, "/protected", past)] += 5
+
+    assert flush_rollups() == 1
+    rollups = _events("protected_route_accessed")
+    assert [event.event_metadata["count"] for event in rollups] == [5]
+    assert len(event_logger._rollups) == 1
+
+def test_failed_flush_keeps_counts_for_the_next_one(monkeypatch):
+    past = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(minutes=2)
+    key = ("protected_route_accessed", 1, "/protected", past)
+    event_logger._rollups[key] += 5
+
+    def locked(events):
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(event_logger, "_write_events", locked)
+        with pytest.raises(OperationalError):
+            flush_rollups()
+    event_logger._rollups[key] += 1
+
+    assert flush_rollups() == 1
+    assert [event.event_metadata["count"] for event in _events("protected_route_accessed")] == [6]
+    assert not event_logger._rollups
+
+def test_security_events_written_individually(client, auth_headers):
+    for _ in range(2):
+        client.post("/login", json={
+            "email": "nonexistentuser@example.com",
+            "password": "DoesNotMatter123"
+        }, headers=auth_headers)
+
+    failures = _events("user_login_failure")
+    assert len(failures) == 2
+    assert "count" not in failures[0].event_metadata
+
+def test_sampled_events(monkeypatch):
+    monkeypatch.setitem(event_logger.SAMPLED_EVENTS, "noisy_event", 0.0)
+    record_event("noisy_event", 1)
+    assert _events("noisy_event") == []
+
+    monkeypatch.setitem(event_logger.SAMPLED_EVENTS, "noisy_event", 1.0)
+    record_event("noisy_event", 1)
+    assert [event.event_metadata["sample_rate"] for event in _events("noisy_event")] == [1.0]
@@ -0,0 +1,126 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app import idempotency
+from app.idempotency import MemoryStore, SQLiteStore
+from app.models import User
+from tests.conftest import TestingSessionLocal
+
+@pytest.fixture(autouse=True)
+def fresh_store():
+    idempotency.store._records.clear()
+    yield
+    idempotency.store._records.clear()
+
+def _user_count():
+    db = TestingSessionLocal()
+    count = db.query(User).count()
+    db.close()
+    return count
+
+def test_register_retry_replays_response(client, auth_headers, random_email):
+    headers = {**auth_headers, "Idempotency-Key": "register-1"}
+    body = {"email": random_email, "password": "Test1234"}
+
+    with patch("app.main.send_verification_email") as mock_send_email:
+        first = client.post("/register", json=body, headers=headers)
+        second = client.post("/register", json=body, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert first.json() == second.json()
+    assert second.headers["idempotent-replayed"] == "true"
+    assert mock_send_email.call_count == 1
+    assert _user_count() == 1
+
+def test_key_reused_with_different_body(client, auth_headers, random_email):
+    headers = {**auth_headers, "Idempotency-Key": "register-2"}
+    client.post("/register", json={"email": random_email, "password": "Test1234"}, headers=headers)
+
+    response = client.post("/register", json={"email": random_email, "password": "Other1234"}, headers=headers)
+    assert response.status_code == 422
+
+def test_idempotency_responses_are_readable_cross_origin(client, auth_headers, random_email):
+    origin = "http://localhost:3000"
+    headers = {**auth_headers, "Idempotency-Key": "register-cors", "Origin": origin}
+    body = {"email": random_email, "password": "Test1234"}
+    client.post("/register", json=body, headers=headers)
+
+    replayed = client.post("/register", json=body, headers=headers)
+    assert replayed.headers["idempotent-replayed"] == "true"
+    assert replayed.headers["access-control-allow-origin"] == origin
+    assert "idempotent-replayed" in replayed.headers["access-control-expose-headers"].lower()
+
+    mismatch = client.post("/register", json={**body, "password": "Other1234"}, headers=headers)
+    assert mismatch.status_code == 422
+    assert mismatch.headers["access-control-allow-origin"] == origin
+
+def test_password_reset_request_retry_sends_one_email(client, auth_headers, random_email):
+    client.post("/register", json={"email": random_email, "password": "Test1234"}, headers=auth_headers)
+    headers = {**auth_headers, "Idempotency-Key": "reset-request-1"}
+
+    with patch("app.main.send_reset_email") as mock_send_reset_email:
+        first = client.post("/request-password-reset", json={"email": random_email}, headers=headers)
+        # Without the key, the retry would hit the cooldown and get a 429
+        second = client.post("/request-password-reset", json={"email": random_email}, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert mock_send_reset_email.call_count == 1
+
+def test_concurrent_duplicates_wait_for_first(client, auth_headers, random_email):
+    calls = []
+
+    def slow_send(email, token):
+        calls.append(email)
+        time.sleep(0.3)
+
+    headers = {**auth_headers, "Idempotency-Key": "register-concurrent"}
+    body = {"email": random_email, "password": "Test1234"}
+    responses = []
+
+    with patch("app.main.send_verification_email", side_effect=slow_send):
+        threads = [
+            threading.Thread(target=lambda: responses.append(client.post("/register", json=body, headers=headers)))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert len(calls) == 1
+    assert _user_count() == 1
+
+def test_requests_without_key_are_not_deduplicated(client, auth_headers, random_email):
+    body = {"email": random_email, "password": "Test1234"}
+    client.post("/register", json=body, headers=auth_headers)
+    response = client.post("/register", json=body, headers=auth_headers)
+    assert response.status_code == 400
+
+def test_memory_store_is_bounded():
+    store = MemoryStore(max_keys=2)
+    for key in ["a", "b", "c"]:
+        assert store.claim(key, "fp") is None
+    assert store.get("a") is None
+    assert store.get("c")["status"] is None
+
+def test_sqlite_store_shared_between_workers(tmp_path):
+    path = str(tmp_path / "idempotency.db")
+    worker_a = SQLiteStore(path)
+    worker_b = SQLiteStore(path)
+
+    assert worker_a.claim("key", "fp") is None
+    assert worker_b.claim("key", "fp") == {"fingerprint": "fp", "status": None, "headers": None, "body": None}
+
+    worker_a.complete("key", "fp", 200, [["content-type", "application/json"]], b"{}")
+    record = worker_b.claim("key", "fp")
+    assert record["status"] == 200
+    assert record["body"] == b"{}"
+
+    assert worker_a.claim("failed", "fp") is None
+    worker_a.release("failed")
+    assert worker_b.claim("failed", "fp") is None
@@ -0,0 +1,101 @@
+import asyncio
+
+from app.load_shedding import AdmissionController, controller
+
+def test_waiter_gets_slot_in_order():
+    async def scenario():
+        ac = AdmissionController(max_concurrency=1, max_queue=4, target=10, interval=10, max_wait=1)
+        assert await ac.acquire()
+
+        waiter = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0.01)
+        assert ac.stats()["queued"] == 1
+
+        ac.release()
+        assert await waiter
+        assert ac.stats()["in_flight"] == 1
+        ac.release()
+        assert ac.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_sheds_when_queue_full_or_wait_too_long():
+    async def scenario():
+        ac = AdmissionController(max_concurrency=1, max_queue=1, target=10, interval=10, max_wait=0.05)
+        assert await ac.acquire()
+
+        queued = asyncio.create_task(ac.acquire())
+        await asyncio.sleep(0.01)
+        assert not await ac.acquire()  # queue is full
+        assert not await queued  # waited longer than max_wait
+        assert ac.stats()["shed"] == 2
+        assert ac.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+def test_enters_dropping_after_sustained_queueing():
+    async def scenario():
+        ac = AdmissionController(max_concurrency=1, max_queue=8, target=0.01, interval=0.02, max_wait=1)
+        assert await ac.acquire()
+
+        # Keep the queue standing longer than target for more than one interval
+        for _ in range(2):
+            waiter = asyncio.create_task(ac.acquire())
+            await asyncio.sleep(0.03)
+            ac.release()
+            assert await waiter
+
+        assert ac.stats()["dropping"]
+        assert not await ac.acquire()  # would have to queue, so it is shed
+
+        # Admission below target leaves the dropping state
+        ac.release()
+        assert await ac.acquire()
+        assert not ac.stats()["dropping"]
+
+    asyncio.run(scenario())
+
+def test_hashing_routes_shed_with_retry_after(client, auth_headers, random_email, monkeypatch):
+    monkeypatch.setattr(controller, "max_concurrency", 0)
+    monkeypatch.setattr(controller, "max_queue", 0)
+
+    response = client.post("/login", json={
+        "email": random_email,
+        "password": "Test1234"
+    }, headers=auth_headers)
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 1
+
+    # Token verification is not subject to admission control
+    protected = client.get("/protected", headers={**auth_headers, "Authorization": "Bearer invalidtoken123"})
+    assert protected.status_code == 401
+
+def test_shed_responses_and_preflights_carry_cors_headers(client, auth_headers, random_email, monkeypatch):
+    monkeypatch.setattr(controller, "max_concurrency", 0)
+    monkeypatch.setattr(controller, "max_queue", 0)
+    origin = "http://localhost:3000"
+    shed_before = controller.stats()["shed"]
+
+    preflight = client.options("/login", headers={
+        "Origin": origin,
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "content-type",
+    })
+    assert preflight.status_code == 200
+    assert preflight.headers["access-control-allow-origin"] == origin
+    assert controller.stats()["shed"] == shed_before
+
+    response = client.post("/login", json={
+        "email": random_email,
+        "password": "Test1234"
+    }, headers={**auth_headers, "Origin": origin})
+    assert response.status_code == 503
+    assert response.headers["access-control-allow-origin"] == origin
+    assert "retry-after" in response.headers["access-control-expose-headers"].lower()
+
+def test_load_shedding_state_exposed_to_admins(client, admin_headers):
+    assert client.get("/admin/load-shedding").status_code == 403
+
+    response = client.get("/admin/load-shedding", headers=admin_headers)
+    assert response.status_code == 200
+    assert {"in_flight", "queued", "dropping", "shed", "last_sojourn_ms"} <= set(response.json())
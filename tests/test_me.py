@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+from app.models import User
+from tests.conftest import TestingSessionLocal
+
+def _bearer(auth_headers, tokens):
+    return {**auth_headers, "Authorization": f"Bearer {tokens['access_token']}"}
+
+def test_me_returns_profile_with_cache_headers(client, auth_headers, random_email, login):
+    headers = _bearer(auth_headers, login(random_email))
+
+    response = client.get("/me", headers=headers)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["email"] == random_email
+    assert data["is_verified"] is True
+    assert data["verified_at"] is not None
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "private, no-cache"
+
+def test_me_not_modified_with_matching_etag(client, auth_headers, random_email, login):
+    headers = _bearer(auth_headers, login(random_email))
+    etag = client.get("/me", headers=headers).headers["etag"]
+
+    response = client.get("/me", headers={**headers, "If-None-Match": f'"other", W/{etag}'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+def test_me_etag_changes_when_user_updated(client, auth_headers, random_email, login):
+    headers = _bearer(auth_headers, login(random_email))
+    etag = client.get("/me", headers=headers).headers["etag"]
+
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.email == random_email).first()
+    user.updated_at = datetime.now(timezone.utc)
+    db.commit()
+    db.close()
+
+    response = client.get("/me", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_me_requires_token(client, auth_headers):
+    response = client.get("/me", headers={**auth_headers, "Authorization": "Bearer invalidtoken123"})
+    assert response.status_code == 401
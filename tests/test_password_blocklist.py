@@ -0,0 +1,86 @@
+import hashlib
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from app import password_blocklist
+from app.main import app
+from app.password_blocklist import PasswordBlocklist, build
+from app.reset_token_handler import create_password_reset_token
+
+BREACHED = ["password", "123456", "qwerty", "Test1234"]
+
+@pytest.fixture
+def blocklist_path(tmp_path):
+    source = tmp_path / "pwned.txt"
+    # HIBP format: uppercase SHA-1 and a count; duplicates must be collapsed
+    lines = [f"{hashlib.sha1(p.encode()).hexdigest().upper()}:{i + 1}" for i, p in enumerate(BREACHED)]
+    source.write_text("\n".join(lines + lines[:1]) + "\n")
+    output = tmp_path / "blocklist.bin"
+    assert build(str(source), str(output), run_size=2) == len(BREACHED)
+    return str(output)
+
+@pytest.fixture
+def blocklist(blocklist_path, monkeypatch):
+    blocklist = PasswordBlocklist(blocklist_path)
+    monkeypatch.setattr(password_blocklist, "_blocklist", blocklist)
+    yield blocklist
+    blocklist.close()
+
+def test_blocklist_lookup(blocklist):
+    assert len(blocklist) == len(BREACHED)
+    for password in BREACHED:
+        assert password in blocklist
+    assert "correct horse battery staple" not in blocklist
+    assert "Test12345" not in blocklist
+
+def test_build_from_plaintext(tmp_path):
+    source = tmp_path / "passwords.txt"
+    source.write_text("hunter2\nletmein\nhunter2\n")
+    output = tmp_path / "blocklist.bin"
+
+    assert build(str(source), str(output), plaintext=True) == 2
+    blocklist = PasswordBlocklist(str(output))
+    assert "hunter2" in blocklist
+    assert "letmein" in blocklist
+    assert "hunter3" not in blocklist
+    blocklist.close()
+
+def test_register_rejects_breached_password(client, auth_headers, random_email, blocklist):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr("app.crud.auth.hash_password", lambda password: pytest.fail("hashed a breached password"))
+        response = client.post("/register", json={
+            "email": random_email,
+            "password": "qwerty"
+        }, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert "data breach" in response.json()["detail"]
+
+def test_reset_rejects_breached_password(client, auth_headers, random_email, blocklist):
+    client.post("/register", json={
+        "email": random_email,
+        "password": "NotBreached987"
+    }, headers=auth_headers)
+
+    response = client.post("/reset-password", json={
+        "token": create_password_reset_token(random_email),
+        "new_password": "password"
+    }, headers=auth_headers)
+
+    assert response.status_code == 400
+    assert "data breach" in response.json()["detail"]
+
+def test_no_blocklist_configured_allows_all(monkeypatch):
+    monkeypatch.setattr(password_blocklist, "_blocklist", None)
+    monkeypatch.setattr(password_blocklist, "PASSWORD_BLOCKLIST_PATH", None)
+    assert not password_blocklist.is_breached("password")
+
+def test_missing_blocklist_fails_at_startup(tmp_path, monkeypatch):
+    monkeypatch.setattr(password_blocklist, "_blocklist", None)
+    monkeypatch.setattr(password_blocklist, "PASSWORD_BLOCKLIST_PATH", str(tmp_path / "missing.bin"))
+
+    with pytest.raises(FileNotFoundError):
+        with TestClient(app):
+            pass
@@ -0,0 +1,59 @@
+import pytest
+
+from app import profiler as profiler_module
+from app.profiler import profiler
+
+@pytest.fixture(autouse=True)
+def reset_profiler():
+    profiler.reset()
+    yield
+    profiler.reset()
+
+def _samples(collapsed: str) -> dict:
+    samples = {}
+    for line in collapsed.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        samples[stack] = int(count)
+    return samples
+
+def test_bcrypt_dominates_login_samples(client, auth_headers, random_email, admin_headers, login):
+    login(random_email)
+
+    for _ in range(3):
+        response = client.post("/login", json={
+            "email": random_email,
+            "password": "Test1234"
+        }, headers={**auth_headers, **admin_headers, "X-Profile": "1"})
+        assert response.status_code == 200
+
+    profile = client.get("/admin/profile", params={"route": "/login"}, headers=admin_headers)
+    assert profile.status_code == 200
+
+    samples = _samples(profile.text)
+    total = sum(samples.values())
+    in_bcrypt = sum(count for stack, count in samples.items() if "bcrypt.py" in stack)
+    assert total > 0
+    assert all(stack.startswith("/login;main.py:login") for stack in samples)
+    assert in_bcrypt / total > 0.5
+
+def test_profiling_requires_admin_key(client, auth_headers, random_email, admin_headers):
+    client.post("/login", json={
+        "email": random_email,
+        "password": "Test1234"
+    }, headers={**auth_headers, "X-Admin-Key": "wrong", "X-Profile": "1"})
+
+    assert profiler.collapsed() == ""
+    assert client.get("/admin/profile", headers={"X-Admin-Key": "wrong"}).status_code == 403
+    assert client.get("/admin/profile").status_code == 403
+
+def test_profiler_idle_when_disabled(client, auth_headers, random_email):
+    assert not profiler_module.PROFILER_ENABLED
+    client.post("/register", json={"email": random_email, "password": "Test1234"}, headers=auth_headers)
+    assert profiler.collapsed() == ""
+    assert not profiler._active.is_set()
+
+def test_reset_profile(client, admin_headers):
+    profiler.stacks["/login;main.py:login"] += 1
+    response = client.delete("/admin/profile", headers=admin_headers)
+    assert response.status_code == 200
+    assert profiler.collapsed() == ""
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import inspect
+
+from app.models import Event, User
+from app.purge import purge_unverified_users
+from tests.conftest import TestingSessionLocal, engine
+
+def _add_user(db, email, is_verified, age):
+    user = User(
+        email=email,
+        hashed_password="x",
+        is_verified=is_verified,
+        created_at=datetime.now(timezone.utc) - age
+    )
+    db.add(user)
+    db.commit()
+
+def test_purge_deletes_only_stale_unverified_users():
+    db = TestingSessionLocal()
+    for i in range(5):
+        _add_user(db, f"stale{i}@example.com", False, timedelta(days=10))
+    _add_user(db, "fresh@example.com", False, timedelta(hours=1))
+    _add_user(db, "verified@example.com", True, timedelta(days=10))
+
+    deleted = purge_unverified_users(db, max_age=timedelta(days=3), batch_size=2, pause=0)
+
+    remaining = {user.email for user in db.query(User).all()}
+    assert deleted == 5
+    assert remaining == {"fresh@example.com", "verified@example.com"}
+
+    event = db.query(Event).filter(Event.event_name == "unverified_users_purged").one()
+    assert event.event_metadata["count"] == 5
+    assert event.event_metadata["batches"] == 3
+    db.close()
+
+def test_purge_without_stale_users_records_nothing():
+    db = TestingSessionLocal()
+    _add_user(db, "fresh@example.com", False, timedelta(hours=1))
+
+    assert purge_unverified_users(db, max_age=timedelta(days=3), pause=0) == 0
+    assert db.query(Event).count() == 0
+    db.close()
+
+def test_unverified_created_at_index_exists():
+    indexes = {index["name"]: index for index in inspect(engine).get_indexes("users")}
+    assert indexes["ix_users_unverified_created_at"]["column_names"] == ["is_verified", "created_at"]
@@ -0,0 +1,66 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from app import crud
+from app.models import User
+from app.verification_token_handler import create_email_verification_token
+from tests.conftest import TestingSessionLocal
+
+@pytest.fixture
+def db_stats():
+    stats = {"checkouts": 0, "user_selects": 0}
+
+    def on_checkout(*args):
+        stats["checkouts"] += 1
+
+    def on_execute(conn, cursor, statement, *args):
+        if statement.startswith("SELECT") and "FROM users" in statement:
+            stats["user_selects"] += 1
+
+    event.listen(Pool, "checkout", on_checkout)
+    event.listen(Engine, "before_cursor_execute", on_execute)
+    yield stats
+    event.remove(Pool, "checkout", on_checkout)
+    event.remove(Engine, "before_cursor_execute", on_execute)
+
+def test_no_checkout_before_first_query(client, auth_headers, db_stats):
+    response = client.get("/protected", headers={**auth_headers, "Authorization": "Token abc"})
+    assert response.status_code == 403
+    assert db_stats["checkouts"] == 0
+
+def test_refresh_loads_user_once(client, auth_headers, random_email, db_stats, login):
+    tokens = login(random_email)
+    db_stats.update(checkouts=0, user_selects=0)
+
+    response = client.post("/refresh", json=tokens["refresh_token"], headers=auth_headers)
+    assert response.status_code == 200
+    assert db_stats["user_selects"] == 1
+    assert db_stats["checkouts"] == 1
+
+def test_verify_email_does_not_reload_after_commit(client, auth_headers, random_email, db_stats):
+    client.post("/register", json={"email": random_email, "password": "Test1234"}, headers=auth_headers)
+    db_stats.update(checkouts=0, user_selects=0)
+
+    token = create_email_verification_token(random_email)
+    client.get(f"/verify-email?token={token}", headers=auth_headers)
+
+    # One for the request session, one for the background event write
+    assert db_stats["user_selects"] == 1
+    assert db_stats["checkouts"] == 2
+
+def test_get_user_served_from_request_session(db_stats):
+    db = TestingSessionLocal()
+    db.add(User(email="cached@example.com", hashed_password="x"))
+    db.commit()
+    user_id = db.query(User.id).scalar()
+    db_stats.update(user_selects=0)
+
+    first = crud.get_user(db, user_id)
+    del first
+    second = crud.get_user(db, user_id)
+
+    assert second.email == "cached@example.com"
+    assert db_stats["user_selects"] == 1
+    db.close()
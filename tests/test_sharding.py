@@ -0,0 +1,199 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import crud, sharding
+from app.jwt_handler import create_access_token, verify_token
+from app.models import Base, Event, User
+from app.purge import purge_unverified_users
+from benchmarks.bench_shards import MODES, measure
+
+def _engine(path):
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+@pytest.fixture
+def shard_engines(tmp_path):
+    engines = [_engine(tmp_path / f"users{shard}.db") for shard in range(3)]
+    Base.metadata.create_all(bind=engines[0])
+    sharding.create_user_tables(engines)
+    yield engines
+    for engine in engines:
+        engine.dispose()
+
+@pytest.fixture
+def ShardedSession(shard_engines):
+    return sharding.make_sessionmaker(shard_engines[0], shard_engines, autoflush=False, expire_on_commit=False)
+
+def _emails(engine):
+    with engine.connect() as conn:
+        return {row.email for row in conn.execute(text("SELECT email FROM users"))}
+
+def test_shard_for_email_is_stable_and_normalized():
+    assert sharding.shard_for_email("Alice@Example.com ", 8) == sharding.shard_for_email("alice@example.com", 8)
+    assert sharding.shard_for_email("alice@example.com", 1) == 0
+
+def test_adding_a_shard_only_moves_users_to_it():
+    emails = [f"user{i}@example.com" for i in range(5000)]
+    before = [sharding.shard_for_email(email, 4) for email in emails]
+    after = [sharding.shard_for_email(email, 5) for email in emails]
+
+    moved = [new for old, new in zip(before, after) if old != new]
+    assert set(moved) == {4}
+    assert 0.15 < len(moved) / len(emails) < 0.25
+
+def test_unsharded_sessionmaker_is_a_plain_session(tmp_path):
+    Session = sharding.make_sessionmaker(_engine(tmp_path / "one.db"), [_engine(tmp_path / "one.db")])
+    assert sharding.user_shards(Session()) is None
+
+def test_non_sqlite_shards_are_rejected(tmp_path):
+    engines = [_engine(tmp_path / "one.db"), create_engine("postgresql://user@localhost/users1")]
+    with pytest.raises(ValueError):
+        sharding.make_sessionmaker(engines[0], engines)
+
+def test_users_are_stored_and_found_on_their_shard(shard_engines, ShardedSession):
+    db = ShardedSession()
+    users = [crud.insert_user(db, f"user{i}@example.com", "hash") for i in range(30)]
+    db.close()
+
+    for user in users:
+        shard = sharding.shard_for_email(user.email, 3)
+        assert sharding.shard_for_user_id(user.id) == shard
+        assert user.email in _emails(shard_engines[shard])
+    assert len({user.id for user in users}) == 30
+    assert sum(len(_emails(engine)) for engine in shard_engines) == 30
+
+    db = ShardedSession()
+    for user in users[:5]:
+        assert crud.get_user(db, user.id).email == user.email
+        assert crud.get_user_by_email(db, user.email).id == user.id
+
+        token = create_access_token({"user_id": user.id, "last_password_reset": str(user.last_password_reset)})
+        assert verify_token(token, db)["user_id"] == user.id
+    db.close()
+
+def test_updates_commit_on_the_users_shard(ShardedSession):
+    db = ShardedSession()
+    crud.insert_user(db, "verify@example.com", "hash")
+    db.close()
+
+    db = ShardedSession()
+    user = crud.get_user_by_email(db, "verify@example.com")
+    user.is_verified = True
+    db.add(Event(event_name="email_verified", user_id=user.id))
+    db.commit()
+    db.close()
+
+    db = ShardedSession()
+    assert crud.get_user_by_email(db, "verify@example.com").is_verified
+    assert db.query(Event).filter(Event.user_id == user.id).count() == 1
+    db.close()
+
+def test_admin_listing_merges_shards_in_order(ShardedSession):
+    db = ShardedSession()
+    for i in range(25):
+        crud.insert_user(db, f"user{i}@example.com", "hash")
+
+    seen = []
+    after = None
+    while True:
+        page = list(crud.iter_users(db, 7, after))
+        seen.extend(page)
+        if len(page) < 7:
+            break
+        after = crud.page_key(page[-1])
+    by_email = list(crud.iter_users(db, 100, email_prefix="user1"))
+    db.close()
+
+    keys = [crud.page_key(row) for row in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert len({row.id for row in seen}) == 25
+    assert [row.email for row in by_email] == sorted(f"user{i}@example.com" for i in [1, *range(10, 20)])
+
+def test_purge_sweeps_every_shard(ShardedSession):
+    db = ShardedSession()
+    for i in range(12):
+        crud.insert_user(db, f"user{i}@example.com", "hash")
+
+    assert purge_unverified_users(db, max_age=timedelta(seconds=-60), batch_size=5, pause=0) == 12
+    assert db.query(User).all() == []
+    db.close()
+
+def _unsharded_users(engine, count):
+    Session = sharding.make_sessionmaker(engine, [engine], autoflush=False, expire_on_commit=False)
+    db = Session()
+    users = [crud.insert_user(db, f"user{i}@example.com", "hash") for i in range(count)]
+    db.add_all(Event(event_name="user_registered", user_id=user.id) for user in users)
+    db.commit()
+    db.close()
+    return users
+
+def test_rebalance_moves_users_and_rewrites_events(tmp_path, shard_engines):
+    single = shard_engines[0]
+    users = _unsharded_users(single, 20)
+
+    id_changes = sharding.rebalance([single], shard_engines, events_engine=single, batch_size=6)
+
+    assert id_changes
+    assert all(sharding.shard_for_user_id(old_id) == 0 for old_id in id_changes)
+    for shard, engine in enumerate(shard_engines):
+        assert all(sharding.shard_for_email(email, 3) == shard for email in _emails(engine))
+    assert sum(len(_emails(engine)) for engine in shard_engines) == 20
+
+    ShardedSession = sharding.make_sessionmaker(single, shard_engines, autoflush=False, expire_on_commit=False)
+    db = ShardedSession()
+    for user in users:
+        moved = crud.get_user_by_email(db, user.email)
+        assert moved.id == id_changes.get(user.id, user.id)
+        assert db.query(Event).filter(Event.user_id == moved.id).count() == 1
+    db.close()
+
+    # Already balanced: nothing left to move
+    assert sharding.rebalance(shard_engines, shard_engines, events_engine=single) == {}
+
+def test_interrupted_rebalance_can_be_rerun(shard_engines, monkeypatch):
+    single = shard_engines[0]
+    users = _unsharded_users(single, 20)
+    rewrite_event_user_ids = sharding._rewrite_event_user_ids
+    calls = []
+
+    def fail_second_batch(events_engine, mapping):
+        calls.append(mapping)
+        if len(calls) == 2:
+            raise RuntimeError("interrupted")
+        rewrite_event_user_ids(events_engine, mapping)
+
+    monkeypatch.setattr(sharding, "_rewrite_event_user_ids", fail_second_batch)
+    with pytest.raises(RuntimeError):
+        sharding.rebalance([single], shard_engines, events_engine=single, batch_size=6)
+    monkeypatch.setattr(sharding, "_rewrite_event_user_ids", rewrite_event_user_ids)
+
+    # The failed batch's users were copied but their events and source rows weren't touched yet
+    with single.connect() as conn:
+        assert conn.scalar(text("SELECT count(*) FROM user_id_moves")) > 0
+    sharding.rebalance([single], shard_engines, events_engine=single, batch_size=6)
+
+    with single.connect() as conn:
+        assert conn.scalar(text("SELECT count(*) FROM user_id_moves")) == 0
+    assert sum(len(_emails(engine)) for engine in shard_engines) == 20
+    ShardedSession = sharding.make_sessionmaker(single, shard_engines, autoflush=False, expire_on_commit=False)
+    db = ShardedSession()
+    for user in users:
+        moved = crud.get_user_by_email(db, user.email)
+        assert sharding.shard_for_user_id(moved.id) == sharding.shard_for_email(user.email, 3)
+        assert db.query(Event).filter(Event.user_id == moved.id).count() == 1
+    db.close()
+
+@pytest.mark.parametrize("mode", MODES)
+def test_shard_benchmark_runs(tmp_path, mode):
+    paths = [str(tmp_path / f"users{shard}.db") for shard in range(2)]
+    result = measure(paths, registrations=20, writers=2, hashed_password="hash", mode=mode)
+    assert result["writes_per_second"] > 0
+
+    engines = [_engine(path) for path in paths]
+    ShardedSession = sharding.make_sessionmaker(engines[0], engines)
+    db = ShardedSession()
+    users = db.query(User).all()
+    db.close()
+    assert len(users) == 20
+    assert all(user.is_verified and sharding.shard_for_user_id(user.id) == sharding.shard_for_email(user.email, 2) for user in users)
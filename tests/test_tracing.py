@@ -0,0 +1,88 @@
+import pytest
+
+from app import tracing
+from app.models import Event
+from tests.conftest import TestingSessionLocal
+
+@pytest.fixture
+def exporter():
+    exporter = tracing.InMemoryExporter()
+    tracing.set_exporter(exporter)
+    yield exporter
+    tracing.set_exporter(None)
+
+def test_register_spans_cover_handler_stages(client, auth_headers, random_email, exporter):
+    response = client.post("/register", json={
+        "email": random_email,
+        "password": "Test1234"
+    }, headers=auth_headers)
+    assert response.status_code == 200
+
+    names = exporter.names()
+    for expected in [
+        "POST /register",
+        "route /register",
+        "fastapi.dependencies",
+        "endpoint.register",
+        "crud.create_user",
+        "auth.hash_password",
+        "db.statement",
+        "jwt.create_email_verification_token",
+        "email.send_verification_email",
+        "events.record_event",
+    ]:
+        assert expected in names, expected
+
+    # Every span belongs to the same trace, rooted at the request span
+    root = next(span for span in exporter.spans if span.name == "POST /register")
+    assert root.parent_id is None
+    assert root.attributes["http.status_code"] == 200
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+
+    hash_span = next(span for span in exporter.spans if span.name == "auth.hash_password")
+    create_span = next(span for span in exporter.spans if span.name == "crud.create_user")
+    assert hash_span.parent_id == create_span.span_id
+
+def test_trace_id_propagated_into_event_metadata(client, auth_headers, random_email, exporter):
+    client.post("/register", json={
+        "email": random_email,
+        "password": "Test1234"
+    }, headers=auth_headers)
+
+    root = next(span for span in exporter.spans if span.name == "POST /register")
+
+    db = TestingSessionLocal()
+    event = db.query(Event).filter(Event.event_name == "user_registered").first()
+    db.close()
+    assert event.event_metadata["trace_id"] == root.trace_id
+
+def test_incoming_traceparent_is_continued(client, auth_headers, exporter):
+    trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+    client.get("/protected", headers={
+        **auth_headers,
+        "Authorization": "Bearer invalidtoken123",
+        "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01",
+    })
+
+    root = next(span for span in exporter.spans if span.name == "GET /protected")
+    assert root.trace_id == trace_id
+    assert root.parent_id == "00f067aa0ba902b7"
+
+    verify_span = next(span for span in exporter.spans if span.name == "jwt.verify_token")
+    assert verify_span.status == "error"
+
+def test_no_spans_when_tracing_disabled(client, auth_headers):
+    assert tracing.get_exporter() is None
+    with tracing.span("unused") as span:
+        assert span is None
+    assert tracing.current_trace_id() is None
+
+def test_otlp_payload_format():
+    span = tracing.Span("test", "4bf92f3577b34da6a3ce929d0e0e4736", attributes={"db.statement": "SELECT 1"})
+    span.end_ns = span.start_ns + 1000
+
+    payload = tracing.otlp_payload([span], "auth-api")
+    otlp_span = payload["resourceSpans"][0]["scopeSpans"][0]["spans"][0]
+    assert otlp_span["traceId"] == span.trace_id
+    assert otlp_span["endTimeUnixNano"] == str(span.end_ns)
+    assert otlp_span["attributes"] == [{"key": "db.statement", "value": {"stringValue": "SELECT 1"}}]